@@ -7,31 +7,75 @@ from flask_restful import Api
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from routes import ROUTES
+from utils.encoding import JSONEncoder, output_json
+from utils.instrumentation import instrument
+from utils.pool import engine_options
 
 from models.token import TokenBlockList
-from models.admin import AdminModel
-from models.organizer import OrganizerModel
-from models.user import UserModel
+from models.claims import resolve_claims
 
 load_dotenv(f"{os.getcwd()}/.env")
 
-UPLOAD_FOLDER = f"{os.getcwd()}/uploads"
-
 app = Flask(__name__)
 CORS(app)
+instrument(app)
 
 ACCESS_EXPIRES = timedelta(hours=1)
 
-#app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 # n'accepte que les demandes dont la taille ne dépasse pas 1 Mo.
 app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DB_URI')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+# GET requests read from this replica when it is set, see `db.RoutingSession`.
+if os.getenv('DB_REPLICA_URI'):
+    app.config['SQLALCHEMY_BINDS'] = {'replica': os.getenv('DB_REPLICA_URI')}
 app.secret_key = os.getenv('FLASK_KEY')
 app.config["JWT_SECRET_KEY"] = os.getenv('JWT_SECRET_KEY')
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = ACCESS_EXPIRES
-
+app.config['CACHE_URL'] = os.getenv('CACHE_URL', 'memory://')
+app.config['CACHE_MAX_ENTRIES'] = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+app.config['REVOCATION_NEGATIVE_TTL'] = int(os.getenv('REVOCATION_NEGATIVE_TTL', 30))
+app.config['CLAIMS_CACHE_TTL'] = int(os.getenv('CLAIMS_CACHE_TTL', 300))
+app.config['SOLD_OUT_TTL'] = int(os.getenv('SOLD_OUT_TTL', 60))
+app.config['RESPONSE_CACHE_TTL'] = int(os.getenv('RESPONSE_CACHE_TTL', 60))
+# fulltext uses the MySQL FULLTEXT index, memory an index kept in each worker and rebuilt
+# when another one changed the events, see CACHE_URL.
+app.config['SEARCH_BACKEND'] = os.getenv('SEARCH_BACKEND') or (
+    'fulltext' if (app.config['SQLALCHEMY_DATABASE_URI'] or '').startswith('mysql') else 'memory'
+)
+# innodb_ft_min_token_size of the server: shorter words are not indexed, so not required.
+app.config['FULLTEXT_MIN_TOKEN_SIZE'] = int(os.getenv('FULLTEXT_MIN_TOKEN_SIZE', 3))
+# 0 disables the background purge of the expired tokens, see `manage.py purge_tokens`.
+app.config['TOKEN_SWEEP_INTERVAL'] = int(os.getenv('TOKEN_SWEEP_INTERVAL', 0))
+app.config['TOKEN_SWEEP_BATCH_SIZE'] = int(os.getenv('TOKEN_SWEEP_BATCH_SIZE', 1000))
+# Bearer token of the Prometheus scrapers on /metrics, which admins can read too.
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+# Image jobs, see `manage.py image_worker`: a failing job is retried after IMAGE_JOB_BACKOFF,
+# then twice as long each time, and given up after IMAGE_JOB_MAX_ATTEMPTS.
+app.config['IMAGE_JOB_MAX_ATTEMPTS'] = int(os.getenv('IMAGE_JOB_MAX_ATTEMPTS', 3))
+app.config['IMAGE_JOB_BACKOFF'] = int(os.getenv('IMAGE_JOB_BACKOFF', 30))
+app.config['IMAGE_JOB_TIMEOUT'] = int(os.getenv('IMAGE_JOB_TIMEOUT', 300))
+# Where the uploads are stored: a folder, uploads in the working directory by default, or
+# s3://bucket/prefix, with S3_ENDPOINT_URL for S3 compatible servers, see `utils.storage`.
+app.config['UPLOAD_STORAGE'] = os.getenv('UPLOAD_STORAGE', f"{os.getcwd()}/uploads")
+app.config['S3_ENDPOINT_URL'] = os.getenv('S3_ENDPOINT_URL')
+app.config['S3_REGION'] = os.getenv('S3_REGION')
+# Uploads: cache lifetime of the content addressed files, front server taking over the
+# sending (x-sendfile or x-accel-redirect to the internal UPLOAD_ACCEL_PREFIX location),
+# and lifetime of the signed links, 0 disabling them.
+app.config['UPLOAD_MAX_AGE'] = int(os.getenv('UPLOAD_MAX_AGE', 31536000))
+app.config['UPLOAD_SENDFILE'] = os.getenv('UPLOAD_SENDFILE', '').lower()
+app.config['UPLOAD_ACCEL_PREFIX'] = os.getenv('UPLOAD_ACCEL_PREFIX', '/_uploads/')
+app.config['USE_X_SENDFILE'] = app.config['UPLOAD_SENDFILE'] == 'x-sendfile'
+app.config['UPLOAD_URL_TTL'] = int(os.getenv('UPLOAD_URL_TTL', 0))
+if app.config['UPLOAD_URL_TTL'] and not app.secret_key:
+    # The links would be signed with an empty key, anyone could forge them.
+    raise RuntimeError("UPLOAD_URL_TTL is set but FLASK_KEY is empty, the upload links cannot be signed.")
+
+app.json_encoder = JSONEncoder
 api = Api(app)
+api.representation('application/json')(output_json)
 
 
 jwt = JWTManager(app)
@@ -39,27 +83,12 @@ jwt = JWTManager(app)
 
 @jwt.token_in_blocklist_loader
 def check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload["jti"]
-    token = TokenBlockList.find_by_jti(jti=jti)
-    return token is not None
+    return TokenBlockList.is_revoked(jti=jwt_payload["jti"], exp=jwt_payload.get("exp"))
 
 
 @jwt.user_identity_loader
 def add_claims_to_jwt(identity):
-    admin = AdminModel.find_by_uuid(_uuid=identity)
-    organizer = OrganizerModel.find_by_uuid(_uuid=identity)
-    client = UserModel.find_by_uuid(_uuid=identity)
-
-    if admin and admin.role == 'superuser':
-        return {'superuser': True, 'admin': False, 'organizer': False, 'client': False}
-    elif admin and admin.role == 'admin':
-        return {'superuser': False, 'admin': True, 'organizer': False, 'client': False}
-    elif organizer:
-        return {'superuser': False, 'admin': False, 'organizer': True, 'client': False}
-    elif client:
-        return {'superuser': False, 'admin': False, 'organizer': False, 'client': True}
-    else:
-        return {'superuser': False, 'admin': False, 'organizer': False, 'client': False}
+    return resolve_claims(identity)
 
 
 @jwt.expired_token_loader
@@ -107,6 +136,11 @@ for route in ROUTES:
 
 if __name__ == '__main__':
     from db import db
+    from cache import cache, response_cache
+    from utils.storage import storage
     db.init_app(app)
+    cache.init_app(app)
+    response_cache.init_app(app)
+    storage.init_app(app)
 
     app.run(debug=os.getenv('DEBUG'))
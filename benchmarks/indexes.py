@@ -0,0 +1,80 @@
+""" EXPLAIN the SQL of the model finders and report the ones that scan a whole table. """
+from sqlalchemy import event
+
+from db import db
+from models.admin import AdminModel
+from models.event import EventModel
+from models.organizer import OrganizerModel
+from models.token import TokenBlockList
+from models.user import UserModel
+from models.waitlist import WaitlistModel
+
+
+def finders():
+    """ The finders to check, called with values that do not need to exist. """
+    return {
+        'EventModel.find_by_name': lambda: EventModel.find_by_name(name='-'),
+        'EventModel.find_by_id': lambda: EventModel.find_by_id(_id=0),
+        'EventModel.find_without_active': lambda: EventModel.find_without_active(_id=0),
+        'EventModel.published_query': lambda: EventModel.find_page(
+            EventModel.with_view(EventModel.published_query(), 'summary')),
+        'EventModel.find_page(upcoming)': lambda: EventModel.find_page(
+            EventModel.published_query(), upcoming=True),
+        'EventModel.allow_query': lambda: EventModel.find_page(
+            EventModel.allow_query(allow=False)),
+        'EventModel.has_participant': lambda: EventModel.has_participant(0, 0),
+        'UserModel.find_by_email': lambda: UserModel.find_by_email(email='-'),
+        'UserModel.find_by_id': lambda: UserModel.find_by_id(_id=0),
+        'UserModel.find_by_uuid': lambda: UserModel.find_by_uuid(_uuid='-'),
+        'OrganizerModel.find_by_email': lambda: OrganizerModel.find_by_email(email='-'),
+        'OrganizerModel.find_by_uuid': lambda: OrganizerModel.find_by_uuid(_uuid='-'),
+        'OrganizerModel.find_page': lambda: OrganizerModel.find_page(depth=1),
+        'AdminModel.find_by_uuid': lambda: AdminModel.find_by_uuid(_uuid='-'),
+        'TokenBlockList.find_by_jti': lambda: TokenBlockList.find_by_jti(jti='-'),
+        'WaitlistModel.find_entry': lambda: WaitlistModel.find_entry(0, 0),
+    }
+
+
+def _capture(finder):
+    """ Run a finder and return the statements it sent to the database. """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        finder()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def _full_scans(connection, statement, parameters):
+    """ Tables the plan of a statement reads entirely. """
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        details = [row[-1] for row in rows if row[-1] != 'SCAN CONSTANT ROW']
+        return [d.split()[1] for d in details if d.startswith('SCAN') and 'USING' not in d]
+
+    rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings()
+    return [row['table'] for row in rows if row['type'] == 'ALL']
+
+
+def run() -> bool:
+    """
+    EXPLAIN every statement of the finders. Run it against a database holding a
+    realistic volume: on nearly empty tables MySQL may prefer a scan to any index.
+    """
+    failures = 0
+    with db.engine.connect() as connection:
+        for name, finder in finders().items():
+            scans = set()
+            for statement, parameters in _capture(finder):
+                scans.update(_full_scans(connection, statement, parameters))
+            if scans:
+                failures += 1
+                print(f"FAILED: {name} scans {', '.join(sorted(scans))}")
+            else:
+                print(f"ok: {name}")
+    return failures == 0
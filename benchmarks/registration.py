@@ -0,0 +1,98 @@
+""" Concurrency benchmark of `EventModel.register_participant`. """
+import time
+from datetime import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+from db import db
+from models.event import (
+    EventModel, participant_events, REGISTERED, ALREADY_REGISTERED, SOLD_OUT)
+from models.organizer import OrganizerModel
+from models.user import UserModel
+from utils import generate_uuid
+
+
+def _create_fixtures(registrations: int, places: int):
+    """ One organizer, one published event and `registrations` users, inserted in bulk. """
+    tag = generate_uuid()
+    organizer = OrganizerModel(f"bench {tag}", '0', f"bench-{tag}@eventhub.com", tag, None)
+    organizer._uuid = f"or_{tag}"
+    organizer.save()
+
+    event = EventModel(
+        f"bench {tag}", 'bench', None, 0, places,
+        datetime.utcnow(), datetime.utcnow(), None, organizer._id)
+    event.active = True
+    event.save()
+
+    password = generate_password_hash(tag)
+    db.session.execute(UserModel.__table__.insert(), [
+        {
+            '_uuid': f"bn{i:09d}",
+            'firstname': 'bench', 'lastname': tag,
+            'email': f"bench-{tag}-{i}@eventhub.com", 'password': password, 'contacts': '0',
+            'active': True, 'deleted': False, 'created_at': event.created_at
+        }
+        for i in range(registrations)
+    ])
+    db.session.commit()
+    user_ids = [
+        row._id for row in db.session.query(UserModel._id).filter_by(lastname=tag)
+    ]
+    return organizer, event, user_ids
+
+
+def _cleanup(organizer, event, user_ids):
+    db.session.execute(
+        participant_events.delete().where(participant_events.c.event_id == event._id))
+    UserModel.query.filter(UserModel._id.in_(user_ids)).delete(synchronize_session=False)
+    EventModel.query.filter_by(_id=event._id).delete(synchronize_session=False)
+    OrganizerModel.query.filter_by(_id=organizer._id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def run(app, registrations=2000, places=100, workers=32, duplicates=10) -> bool:
+    """
+    Register `registrations` users, every `duplicates`-th one twice, from `workers`
+    threads at an event of `places` places, then check the event is not overbooked.
+    """
+    organizer, event, user_ids = _create_fixtures(registrations, places)
+    attempts = user_ids + user_ids[::duplicates]
+    # The threads get the id only: `event` belongs to the session of this thread.
+    event_id = event._id
+
+    def register(user_id):
+        with app.app_context():
+            try:
+                return EventModel.register_participant(event_id, user_id)
+            except Exception as e:
+                return type(e).__name__
+            finally:
+                db.session.remove()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        statuses = Counter(executor.map(register, attempts))
+    elapsed = time.perf_counter() - started
+
+    participants = db.session.query(db.func.count()).select_from(participant_events).filter(
+        participant_events.c.event_id == event_id).scalar()
+    remaining = db.session.query(EventModel.remaining_places).filter_by(_id=event_id).scalar()
+    _cleanup(organizer, event, user_ids)
+
+    print(f"{len(attempts)} registrations in {elapsed:.2f}s "
+          f"({len(attempts) / elapsed:.0f}/s) with {workers} workers: {dict(statuses)}")
+    print(f"{participants} participants for {places} places, {remaining} remaining.")
+
+    checks = {
+        'no errors': set(statuses) <= {REGISTERED, ALREADY_REGISTERED, SOLD_OUT},
+        'no overbooking': participants <= places and remaining >= 0,
+        'places accounted': participants + remaining == places,
+        'one row per registration': participants == statuses[REGISTERED],
+        'sold out only when full': not statuses[SOLD_OUT] or remaining == 0,
+    }
+    for name, passed in checks.items():
+        print(f"{'ok' if passed else 'FAILED'}: {name}")
+    return all(checks.values())
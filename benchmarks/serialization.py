@@ -0,0 +1,62 @@
+""" Micro-benchmark of the per-row cost of `EventModel.json`. """
+import time
+from datetime import datetime
+
+from models.event import EventModel
+from models.user import UserModel
+from schema.user import UserSchema, users_schema
+
+
+def _events(rows: int, participants: int) -> list:
+    """ Transient events and users, so that only the serialization is measured. """
+    now = datetime.utcnow()
+    users = []
+    for i in range(participants):
+        user = UserModel('bench', str(i), f"bench-{i}@eventhub.com", 'x', '0', None)
+        user._id, user.active, user.deleted, user.created_at = i, True, False, now
+        users.append(user)
+
+    events = []
+    for i in range(rows):
+        event = EventModel(
+            f"bench {i}", 'bench', 'bench', 0, participants, now, now, None, 1)
+        event._id, event.active, event.allow, event.deleted = i, True, True, False
+        event.created_at = now
+        event.participants = users
+        events.append(event)
+    return events
+
+
+def _per_row(serialize, events) -> float:
+    """ Microseconds spent per event by `serialize`. """
+    started = time.perf_counter()
+    for event in events:
+        serialize(event)
+    return (time.perf_counter() - started) / len(events) * 1e6
+
+
+def run(rows=10000, participants=5) -> bool:
+    """
+    Serialize `rows` events of `participants` participants with a schema built per
+    call, as `json()` used to, then with the module-level schema it uses now.
+    """
+    events = _events(rows, participants)
+
+    def per_call(event):
+        UserSchema(many=True).dump(event.participants)
+
+    def shared(event):
+        users_schema.dump(event.participants)
+
+    results = {
+        'participants, schema per call': _per_row(per_call, events),
+        'participants, shared schema': _per_row(shared, events),
+        'EventModel.json()': _per_row(lambda event: event.json(), events),
+    }
+    print(f"{rows} events of {participants} participants:")
+    for name, cost in results.items():
+        print(f"{cost:8.1f} µs/row  {name}")
+
+    passed = results['participants, shared schema'] < results['participants, schema per call']
+    print(f"{'ok' if passed else 'FAILED'}: shared schema is faster")
+    return passed
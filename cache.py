@@ -0,0 +1,4 @@
+from utils.cache import Cache, ResponseCache
+
+cache = Cache()
+response_cache = ResponseCache(cache)
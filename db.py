@@ -1,3 +1,92 @@
-from flask_sqlalchemy import SQLAlchemy
+from flask import has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 
-db = SQLAlchemy()
+from utils.pool import InstrumentedQueuePool
+
+REPLICA = 'replica'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Per request flag, in the WSGI environ so that it never outlives the request.
+STICKY = 'eventhub.stick_to_primary'
+
+
+def stick_to_primary() -> None:
+    """ Send the rest of the request to the primary, to read what it has just written. """
+    if has_request_context():
+        request.environ[STICKY] = True
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session reading from the `replica` bind, when SQLALCHEMY_BINDS has one, during
+    GET requests. Flushes, INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE and raw SQL go
+    to the primary and pin the rest of the request to it, as does a commit, so that
+    a request always reads its own writes.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if mapper is not None and mapper.persist_selectable.info.get('bind_key'):
+            return super().get_bind(mapper, clause)
+        if self._use_replica(clause):
+            return self.db.get_engine(self.app, bind=REPLICA)
+        if clause is not None or self._flushing:
+            stick_to_primary()
+        return super().get_bind(mapper, clause)
+
+    def _use_replica(self, clause) -> bool:
+        if (
+            self._flushing
+            or REPLICA not in (self.app.config.get('SQLALCHEMY_BINDS') or {})
+            or not has_request_context()
+            or request.method not in READ_METHODS
+            or request.environ.get(STICKY)
+        ):
+            return False
+        return getattr(clause, 'is_select', False) and clause._for_update_arg is None
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    stick_to_primary()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def get_engine(self, app=None, bind=None):
+        engine = super().get_engine(app, bind)
+        if isinstance(engine.pool, InstrumentedQueuePool):
+            engine.pool.name = bind or 'primary'
+        return engine
+
+
+db = RoutingSQLAlchemy()
+
+
+def insert_ignore(table, rows, connection=None):
+    """
+    Multi-row INSERT of `rows` into `table`, skipping the rows whose primary key
+    already exists: ON DUPLICATE KEY UPDATE on MySQL, ON CONFLICT DO NOTHING on
+    SQLite and PostgreSQL. Runs in the current transaction, or on `connection`.
+    """
+    if not rows:
+        return
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        statement = mysql.insert(table)
+        statement = statement.on_duplicate_key_update({
+            column.name: statement.inserted[column.name] for column in table.primary_key
+        })
+    elif dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        statement = insert(table).on_conflict_do_nothing()
+    else:
+        statement = table.insert()
+    (connection or db.session).execute(statement, rows)
@@ -1,8 +1,12 @@
 from app import app
 from db import db
+from cache import cache, response_cache
+from utils.storage import storage
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
 from models.admin import AdminModel
+from models.token import TokenBlockList
+from models.upload_ref import UploadRefModel  # noqa: F401, registers upload_refs for the migrations
 
 migrate = Migrate(app, db)
 
@@ -27,7 +31,66 @@ def admin_seeder():
         print(e.__str__())
 
 
+@manager.option('-b', '--batch-size', dest='batch_size', type=int, default=1000)
+def purge_tokens(batch_size):
+    """ delete the expired tokens from the blocklist. """
+    purged = TokenBlockList.purge_expired(batch_size=batch_size)
+    print(f"{purged} expired tokens purged, {TokenBlockList.count()} left.")
+
+
+@manager.option('-r', '--registrations', dest='registrations', type=int, default=2000)
+@manager.option('-p', '--places', dest='places', type=int, default=100)
+@manager.option('-w', '--workers', dest='workers', type=int, default=32)
+def bench_registration(registrations, places, workers):
+    """ fire parallel registrations at one event and check it is not overbooked. """
+    from benchmarks import registration
+    if not registration.run(app, registrations, places, workers):
+        raise SystemExit(1)
+
+
+@manager.option('-n', '--rows', dest='rows', type=int, default=10000)
+@manager.option('-p', '--participants', dest='participants', type=int, default=5)
+def bench_serialization(rows, participants):
+    """ time the per-row serialization of the events. """
+    from benchmarks import serialization
+    if not serialization.run(rows, participants):
+        raise SystemExit(1)
+
+
+@manager.option('-p', '--processes', dest='processes', type=int, default=None)
+@manager.option('-i', '--poll-interval', dest='poll_interval', type=float, default=2.0)
+@manager.option('--once', dest='once', action='store_true', default=False)
+def image_worker(processes, poll_interval, once):
+    """ make the variants of the uploaded images in a pool of processes. """
+    from workers import images
+    images.run(app, processes, poll_interval, once)
+
+
+@manager.option('--requeue', dest='requeue', action='store_true', default=False)
+@manager.option('--discard', dest='discard', action='store_true', default=False)
+def image_dead_letters(requeue, discard):
+    """ list the image jobs given up after their last attempt, queue them again or delete them. """
+    from models.image_job import ImageJobModel
+    for job in ImageJobModel.find_dead():
+        print(f"{job._id} {job.folder}/{job.filename} target {job.target_id}: {job.last_error}")
+        if requeue:
+            job.requeue()
+        elif discard:
+            job.discard()
+
+
+@manager.command
+def check_indexes():
+    """ explain the finders queries and fail if one scans a whole table. """
+    from benchmarks import indexes
+    if not indexes.run():
+        raise SystemExit(1)
+
+
 db.init_app(app)
+cache.init_app(app)
+response_cache.init_app(app)
+storage.init_app(app)
 
 if __name__ == '__main__':
     manager.run()
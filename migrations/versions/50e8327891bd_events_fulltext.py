@@ -0,0 +1,26 @@
+"""events fulltext
+
+Revision ID: 50e8327891bd
+Revises: f13ed9083374
+Create Date: 2026-10-18 15:26:18.940362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '50e8327891bd'
+down_revision = 'f13ed9083374'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_events_fulltext', 'events', ['name', 'location', 'description'],
+        unique=False, mysql_prefix='FULLTEXT')
+
+
+def downgrade():
+    op.drop_index('ix_events_fulltext', table_name='events')
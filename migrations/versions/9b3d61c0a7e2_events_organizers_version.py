@@ -0,0 +1,28 @@
+"""events and organizers version
+
+Revision ID: 9b3d61c0a7e2
+Revises: 50e8327891bd
+Create Date: 2026-10-18 16:02:41.512874
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3d61c0a7e2'
+down_revision = '50e8327891bd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('events', sa.Column(
+        'version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('organizers', sa.Column(
+        'version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('organizers', 'version')
+    op.drop_column('events', 'version')
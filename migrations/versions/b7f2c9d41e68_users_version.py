@@ -0,0 +1,25 @@
+"""users version
+
+Revision ID: b7f2c9d41e68
+Revises: e1a5d7c3b920
+Create Date: 2026-10-18 19:12:05.284113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7f2c9d41e68'
+down_revision = 'e1a5d7c3b920'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column(
+        'version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('users', 'version')
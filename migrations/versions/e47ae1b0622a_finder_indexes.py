@@ -0,0 +1,46 @@
+"""finder indexes
+
+Revision ID: e47ae1b0622a
+Revises: 135b2ab7b295
+Create Date: 2026-10-18 14:51:05.604417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e47ae1b0622a'
+down_revision = '135b2ab7b295'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # MySQL has no partial indexes: the boolean flags every finder filters on lead the
+    # indexes, followed by the keyset order of the listings.
+    op.create_index(
+        'ix_events_active_allow_deleted_created_at', 'events',
+        ['active', 'allow', 'deleted', 'created_at', '_id'], unique=False)
+    op.create_index(
+        'ix_events_allow_deleted_created_at', 'events',
+        ['allow', 'deleted', 'created_at', '_id'], unique=False)
+    op.create_index(
+        'ix_events_name_active_allow_deleted', 'events',
+        ['name', 'active', 'allow', 'deleted'], unique=False)
+    op.create_index('ix_events_organizer_id', 'events', ['organizer_id'], unique=False)
+    op.create_index(
+        'ix_participant_events_event_id', 'participant_events',
+        ['event_id', 'user_id'], unique=False)
+    op.create_index('ix_users_active_deleted', 'users', ['active', 'deleted', '_id'], unique=False)
+    op.create_index('ix_organizers_active', 'organizers', ['active', '_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_organizers_active', table_name='organizers')
+    op.drop_index('ix_users_active_deleted', table_name='users')
+    op.drop_index('ix_participant_events_event_id', table_name='participant_events')
+    op.drop_index('ix_events_organizer_id', table_name='events')
+    op.drop_index('ix_events_name_active_allow_deleted', table_name='events')
+    op.drop_index('ix_events_allow_deleted_created_at', table_name='events')
+    op.drop_index('ix_events_active_allow_deleted_created_at', table_name='events')
@@ -0,0 +1,115 @@
+"""events datetime start_at end_at
+
+Revision ID: f13ed9083374
+Revises: e47ae1b0622a
+Create Date: 2026-10-18 15:07:41.253980
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f13ed9083374'
+down_revision = 'e47ae1b0622a'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+# Formats seen in the string columns besides ISO 8601.
+FORMATS = ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%d-%m-%Y %H:%M', '%d-%m-%Y')
+
+events = sa.table(
+    'events',
+    sa.column('_id', sa.Integer),
+    sa.column('start_at', sa.String),
+    sa.column('end_at', sa.String),
+    sa.column('start_at_dt', sa.DateTime),
+    sa.column('end_at_dt', sa.DateTime),
+    sa.column('created_at', sa.DateTime),
+)
+
+
+def parse(value):
+    """ Parse a stored date, None when it cannot be read. """
+    value = (value or '').strip()
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    except ValueError:
+        pass
+    for date_format in FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def upgrade():
+    op.add_column('events', sa.Column('start_at_dt', sa.DateTime(), nullable=True))
+    op.add_column('events', sa.Column('end_at_dt', sa.DateTime(), nullable=True))
+
+    # Backfill by primary key ranges so that no statement reads the whole table.
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select([events.c._id, events.c.start_at, events.c.end_at, events.c.created_at])
+            .where(events.c._id > last_id)
+            .order_by(events.c._id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            start_at = parse(row.start_at)
+            end_at = parse(row.end_at)
+            if start_at is None or end_at is None:
+                print(f"events {row._id}: unreadable dates {row.start_at!r} {row.end_at!r}, "
+                      "created_at used instead.")
+            start_at = start_at or row.created_at
+            connection.execute(
+                events.update()
+                .where(events.c._id == row._id)
+                .values(start_at_dt=start_at, end_at_dt=end_at or start_at)
+            )
+        last_id = rows[-1]._id
+
+    op.drop_column('events', 'start_at')
+    op.drop_column('events', 'end_at')
+    op.alter_column(
+        'events', 'start_at_dt', new_column_name='start_at',
+        existing_type=sa.DateTime(), nullable=False)
+    op.alter_column(
+        'events', 'end_at_dt', new_column_name='end_at',
+        existing_type=sa.DateTime(), nullable=False)
+    op.create_index(
+        'ix_events_active_allow_deleted_start_at', 'events',
+        ['active', 'allow', 'deleted', 'start_at', '_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_events_active_allow_deleted_start_at', table_name='events')
+    op.alter_column(
+        'events', 'start_at', new_column_name='start_at_dt',
+        existing_type=sa.DateTime(), nullable=True)
+    op.alter_column(
+        'events', 'end_at', new_column_name='end_at_dt',
+        existing_type=sa.DateTime(), nullable=True)
+    op.add_column('events', sa.Column('start_at', sa.String(length=80), nullable=True))
+    op.add_column('events', sa.Column('end_at', sa.String(length=80), nullable=True))
+    op.execute(
+        events.update().values(
+            start_at=sa.cast(events.c.start_at_dt, sa.String(80)),
+            end_at=sa.cast(events.c.end_at_dt, sa.String(80))
+        )
+    )
+    op.alter_column('events', 'start_at', existing_type=sa.String(length=80), nullable=False)
+    op.alter_column('events', 'end_at', existing_type=sa.String(length=80), nullable=False)
+    op.drop_column('events', 'start_at_dt')
+    op.drop_column('events', 'end_at_dt')
@@ -1,7 +1,7 @@
 from db import db
 from datetime import datetime
 from werkzeug.security import generate_password_hash
-from utils import json_dump_, generate_uuid
+from utils import format_datetime, generate_uuid
 
 
 class AdminModel(db.Model):
@@ -39,8 +39,8 @@ class AdminModel(db.Model):
             'contacts': self.contacts,
             'role': self.role,
             'active': self.active,
-            'created_at': json_dump_(self.created_at),
-            'updated_at': json_dump_(self.updated_at)
+            'created_at': format_datetime(self.created_at),
+            'updated_at': format_datetime(self.updated_at)
         }
 
     @classmethod
@@ -63,6 +63,11 @@ class AdminModel(db.Model):
         """ Find all admin in the database. """
         return cls.query.filter_by(active=active).all()
 
+    @classmethod
+    def export_query(cls, batch_size: int, active=True):
+        """ All the admins, loaded `batch_size` rows at a time, for streamed exports. """
+        return cls.query.filter_by(active=active).order_by(cls._id).yield_per(batch_size)
+
     def save(self):
         """ Save new admin into database. """
         db.session.add(self)
@@ -0,0 +1,59 @@
+from flask import current_app
+from cache import cache
+from models.admin import AdminModel
+from models.organizer import OrganizerModel
+from models.user import UserModel
+
+# The `_uuid` prefix tells the account type, see the `_uuid` column defaults.
+ACCOUNT_MODELS = {'ad': AdminModel, 'or': OrganizerModel, 'us': UserModel}
+
+
+def _claims(superuser=False, admin=False, organizer=False, client=False, uuid=None) -> dict:
+    return {
+        'superuser': superuser,
+        'admin': admin,
+        'organizer': organizer,
+        'client': client,
+        'uuid': uuid
+    }
+
+
+def load_claims(uuid: str) -> dict:
+    """ Build the claims of an account with a single lookup in the table of its type. """
+    model = ACCOUNT_MODELS.get(uuid.split('_', 1)[0])
+    account = model.find_by_uuid(_uuid=uuid) if model else None
+
+    if isinstance(account, AdminModel) and account.role == 'superuser':
+        return _claims(superuser=True, uuid=uuid)
+    elif isinstance(account, AdminModel) and account.role == 'admin':
+        return _claims(admin=True, uuid=uuid)
+    elif isinstance(account, OrganizerModel):
+        return _claims(organizer=True, uuid=uuid)
+    elif isinstance(account, UserModel):
+        return _claims(client=True, uuid=uuid)
+    return _claims(uuid=uuid)
+
+
+def resolve_claims(identity) -> dict:
+    """
+    Claims of the account identified by `identity`, cached for CLAIMS_CACHE_TTL seconds.
+
+    On refresh the identity is the claims of the refresh token, the account is then
+    resolved again from their `uuid`.
+    """
+    if isinstance(identity, dict):
+        if not identity.get('uuid'):
+            return identity
+        identity = identity['uuid']
+
+    key = f"claims:{identity}"
+    claims = cache.get(key)
+    if claims is None:
+        claims = load_claims(identity)
+        cache.set(key, claims, current_app.config['CLAIMS_CACHE_TTL'])
+    return claims
+
+
+def invalidate_claims(uuid: str) -> None:
+    """ Forget the cached claims of an account whose role or activation changed. """
+    cache.delete(f"claims:{uuid}")
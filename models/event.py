@@ -1,6 +1,28 @@
-from db import db
+from db import db, insert_ignore, stick_to_primary
+from cache import cache, response_cache
 from datetime import datetime
-from utils import json_dump_
+from flask import current_app
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import column_property, selectinload, undefer
+from models.user import UserModel
+from models.waitlist import WaitlistModel
+from schema.user import users_schema
+from utils import format_datetime
+from utils.pagination import DEFAULT_PAGE_SIZE, keyset_page, keyset_query
+from utils.search import InvertedIndex, boolean_query, tokenize
+
+REGISTERED = 'registered'
+ALREADY_REGISTERED = 'already_registered'
+SOLD_OUT = 'sold_out'
+WAITLISTED = 'waitlisted'
+EVENT_NOT_FOUND = 'event_not_found'
+USER_NOT_FOUND = 'user_not_found'
+
+# In-process search index of the published events, used when SEARCH_BACKEND is memory.
+# Its generation is the one of the events response cache, shared by the workers: the
+# index is rebuilt when another worker changed the events.
+search_index = InvertedIndex(weights={'name': 3.0, 'location': 2.0, 'description': 1.0})
 
 participant_events = db.Table(
     'participant_events',
@@ -9,12 +31,27 @@ participant_events = db.Table(
         primary_key=True),
     db.Column(
         'event_id', db.Integer, db.ForeignKey('events._id'),
-        primary_key=True)
+        primary_key=True),
+    db.Index('ix_participant_events_event_id', 'event_id', 'user_id')
 )
 
 
 class EventModel(db.Model):
     __tablename__ = 'events'
+    # Equality filters first, then the keyset order of the listings.
+    __table_args__ = (
+        db.Index(
+            'ix_events_active_allow_deleted_created_at',
+            'active', 'allow', 'deleted', 'created_at', '_id'),
+        db.Index('ix_events_allow_deleted_created_at', 'allow', 'deleted', 'created_at', '_id'),
+        db.Index(
+            'ix_events_active_allow_deleted_start_at',
+            'active', 'allow', 'deleted', 'start_at', '_id'),
+        db.Index('ix_events_name_active_allow_deleted', 'name', 'active', 'allow', 'deleted'),
+        db.Index('ix_events_organizer_id', 'organizer_id'),
+        db.Index(
+            'ix_events_fulltext', 'name', 'location', 'description', mysql_prefix='FULLTEXT'),
+    )
 
     _id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
@@ -23,9 +60,11 @@ class EventModel(db.Model):
     price = db.Column(db.Float)
     available_places = db.Column(db.Integer, nullable=False)
     remaining_places = db.Column(db.Integer, nullable=False)
-    start_at = db.Column(db.String(80), nullable=False)
-    end_at = db.Column(db.String(80), nullable=False)
+    start_at = db.Column(db.DateTime, nullable=False)
+    end_at = db.Column(db.DateTime, nullable=False)
     image = db.Column(db.String(120))
+    # pending while a new image is processed, see models.image_job.
+    image_status = db.Column(db.String(10))
     active = db.Column(db.Boolean, default=False, nullable=False)
     allow = db.Column(db.Boolean, default=True, nullable=False)
     organizer_id = db.Column(
@@ -36,11 +75,21 @@ class EventModel(db.Model):
     participants = db.relationship(
         'UserModel',
         secondary=participant_events,
-        lazy='subquery'
+        lazy='select'
+    )
+    participants_count = column_property(
+        select([func.count(participant_events.c.user_id)])
+        .where(participant_events.c.event_id == _id)
+        .correlate_except(participant_events)
+        .scalar_subquery(),
+        deferred=True
     )
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
     deleted = db.Column(db.Boolean, default=False, nullable=False)
+    # Bumped by every UPDATE of the row, registrations included: the ETag of the event.
+    version = db.Column(
+        db.Integer, default=1, onupdate=db.literal_column('version + 1'), nullable=False)
 
     def __init__(
         self, name, location, description, price,
@@ -57,11 +106,13 @@ class EventModel(db.Model):
         self.image = image
         self.organizer_id = organizer_id
 
-    def json(self):
-        from schema.user import UserSchema
-        users_schema = UserSchema(many=True)
+    def json(self, view='full'):
+        """
+        Use to format the event object in json.
 
-        return {
+        The `summary` view replaces the participants list by their count.
+        """
+        data = {
             '_id': self._id,
             'name': self.name,
             'location': self.location,
@@ -69,17 +120,22 @@ class EventModel(db.Model):
             'price': self.price,
             'available_places': self.available_places,
             'remaining_places': self.remaining_places,
-            'start_at': self.start_at,
-            'end_at': self.end_at,
+            'start_at': format_datetime(self.start_at),
+            'end_at': format_datetime(self.end_at),
             'image': self.image,
+            'image_status': self.image_status,
             'active': self.active,
             'allow': self.allow,
             'deleted': self.deleted,
             'organizer_id': self.organizer_id,
-            'participants': users_schema.dump(self.participants),
-            'created_at': json_dump_(self.created_at),
-            'updated_at': json_dump_(self.updated_at)
+            'created_at': format_datetime(self.created_at),
+            'updated_at': format_datetime(self.updated_at)
         }
+        if view == 'summary':
+            data['participants_count'] = self.participants_count
+        else:
+            data['participants'] = users_schema.dump(self.participants)
+        return data
 
     @classmethod
     def find_by_name(cls, name: str, active=True, allow=True):
@@ -107,30 +163,419 @@ class EventModel(db.Model):
     @classmethod
     def find_all(cls, active=True, allow=True):
         """ Find all events in the database. """
+        return cls.published_query(active=active, allow=allow).all()
+
+    @classmethod
+    def find_allow(cls, allow=True):
+        return cls.allow_query(allow=allow).all()
+
+    @classmethod
+    def published_query(cls, active=True, allow=True):
+        """ Query of the events listed by /events and /events/unpublished. """
         return cls.query.filter_by(
             active=active).filter_by(
             deleted=False).filter_by(
-            allow=True).all()
+            allow=True)
 
     @classmethod
-    def find_allow(cls, allow=True):
-        return cls.query.filter_by(allow=allow).filter_by(deleted=False).all()
+    def allow_query(cls, allow=True):
+        """ Query of the events listed by /events/unauthorized. """
+        return cls.query.filter_by(allow=allow).filter_by(deleted=False)
+
+    @classmethod
+    def filter_query(
+        cls, query, location=None, price_min=None, price_max=None,
+        start_from=None, start_to=None
+    ):
+        """ Narrow an events query with the listing filters. """
+        if location:
+            query = query.filter(cls.location == location)
+        if price_min is not None:
+            query = query.filter(cls.price >= price_min)
+        if price_max is not None:
+            query = query.filter(cls.price <= price_max)
+        if start_from:
+            query = query.filter(cls.start_at >= start_from)
+        if start_to:
+            query = query.filter(cls.start_at <= start_to)
+        return query
+
+    @classmethod
+    def with_view(cls, query, view='full'):
+        """ Load in the same round trip what `json(view)` will read. """
+        if view == 'summary':
+            return query.options(undefer(cls.participants_count))
+        return query.options(selectinload(cls.participants))
+
+    @classmethod
+    def page_query(
+        cls, query, cursor=None, limit=DEFAULT_PAGE_SIZE, upcoming=False, start_from=None
+    ):
+        """
+        Query of one page of events, newest first, or for upcoming events soonest
+        first from `start_from` (now by default). Returns it with its sort columns.
+        """
+        if upcoming:
+            query = query.filter(cls.start_at >= (start_from or datetime.utcnow()))
+            columns = (cls.start_at, cls._id)
+            return keyset_query(query, columns, cursor, limit, descending=False), columns
+        columns = (cls.created_at, cls._id)
+        return keyset_query(query, columns, cursor, limit), columns
+
+    @classmethod
+    def find_page(
+        cls, query, cursor=None, limit=DEFAULT_PAGE_SIZE, upcoming=False, start_from=None
+    ):
+        """ Find one page of events and the cursor of the next page, see `page_query`. """
+        page, columns = cls.page_query(query, cursor, limit, upcoming, start_from)
+        return keyset_page(page.all(), columns, limit)
+
+    @classmethod
+    def participants_validators(cls, events) -> tuple:
+        """
+        Fingerprint of the participants the full view of `events` embeds, a list or a
+        select of event ids: per event their count, ids sum and versions sum, which a
+        registration or a profile update moves.
+        """
+        return tuple(tuple(row) for row in db.session.query(
+            participant_events.c.event_id,
+            func.count(),
+            func.sum(participant_events.c.user_id),
+            func.sum(UserModel.version)
+        ).select_from(participant_events).join(
+            UserModel, UserModel._id == participant_events.c.user_id
+        ).filter(
+            participant_events.c.event_id.in_(events)
+        ).group_by(participant_events.c.event_id).order_by(participant_events.c.event_id))
+
+    @classmethod
+    def page_validators(cls, page, view='summary'):
+        """
+        Fingerprint of a page query, read from the ids and versions of its rows, and of
+        their participants in the full view, without loading the events. Lists have no
+        last modification: an event leaving the page would not move it.
+        """
+        rows = page.with_entities(cls._id, cls.version).all()
+        fingerprint = tuple((row._id, row.version) for row in rows)
+        if view != 'summary' and rows:
+            fingerprint += cls.participants_validators([row._id for row in rows])
+        return fingerprint
+
+    def validators(self, view='full'):
+        """
+        Fingerprint and last modification of the event. The full view has none of the
+        latter: the profile update of a participant would not move it.
+        """
+        if view == 'summary':
+            return (self._id, self.version), self.updated_at or self.created_at
+        return (self._id, self.version) + self.participants_validators([self._id]), None
+
+    @classmethod
+    def search(cls, terms: str, limit=DEFAULT_PAGE_SIZE, view='summary'):
+        """ Find the published events matching `terms`, best ranked first. """
+        query = cls.with_view(cls.published_query(), view)
+        tokens = tokenize(terms)
+        if not tokens:
+            return []
+
+        if current_app.config['SEARCH_BACKEND'] == 'fulltext':
+            # Prefix match on every indexed word, accents are folded by the column collation.
+            match = (
+                "MATCH (events.name, events.location, events.description) "
+                "AGAINST (:terms IN BOOLEAN MODE)"
+            )
+            return (
+                query.filter(text(match))
+                .order_by(text(f"{match} DESC"), cls._id)
+                .params(terms=boolean_query(
+                    tokens, current_app.config['FULLTEXT_MIN_TOKEN_SIZE']))
+                .limit(limit).all()
+            )
+
+        if not search_index.built or search_index.generation != response_cache.generation('events'):
+            cls.build_search_index()
+        ids = search_index.search(' '.join(tokens), limit)
+        if not ids:
+            return []
+        events = {event._id: event for event in query.filter(cls._id.in_(ids))}
+        return [events[_id] for _id in ids if _id in events]
+
+    @classmethod
+    def build_search_index(cls):
+        """ Load the published events into the in-process search index. """
+        # Read first: a change made while loading makes the index stale, not missed.
+        generation = response_cache.generation('events')
+        # From the primary: a lagging replica would stamp old rows with this generation,
+        # and the index would stay stale until the next write.
+        stick_to_primary()
+        rows = db.session.query(
+            cls._id, cls.name, cls.location, cls.description).filter(
+            cls.active.is_(True)).filter(
+            cls.allow.is_(True)).filter(
+            cls.deleted.is_(False)).yield_per(1000)
+        search_index.rebuild((
+            (row._id, {'name': row.name, 'location': row.location,
+                       'description': row.description})
+            for row in rows
+        ), generation)
+
+    def update_search_index(self):
+        """ Index the event if it is published, remove it from the index otherwise. """
+        if not search_index.built:
+            return
+        if self.active and self.allow and not self.deleted:
+            search_index.add(self._id, {
+                'name': self.name,
+                'location': self.location,
+                'description': self.description
+            })
+        else:
+            search_index.remove(self._id)
+
+    @classmethod
+    def changed(cls):
+        """
+        Drop the cached events responses after a committed change. The search index
+        stays current when it only missed this change, already applied to it.
+        """
+        generation = response_cache.invalidate('events')
+        if search_index.generation == generation - 1:
+            search_index.generation = generation
 
     def save(self):
         """ Save new event into database. """
         db.session.add(self)
         db.session.commit()
+        self.update_search_index()
+        self.changed()
 
     def delete(self):
         """ Delete an existing event from database. """
+        search_index.remove(self._id)
         db.session.delete(self)
         db.session.commit()
+        self.changed()
 
     def add_participant(self, user):
         self.participants.append(user)
         db.session.add(self)
         db.session.commit()
+        self.changed()
 
     def remove_participant(self, user):
         self.participants.remove(user)
         db.session.commit()
+        self.changed()
+
+    @classmethod
+    def has_participant(cls, event_id: int, user_id: int) -> bool:
+        """ Tell if a user is registered to an event, using the primary key only. """
+        return db.session.query(
+            select([participant_events.c.user_id])
+            .where(participant_events.c.event_id == event_id)
+            .where(participant_events.c.user_id == user_id)
+            .exists()
+        ).scalar()
+
+    @classmethod
+    def register_participant(cls, event_id: int, user_id: int) -> str:
+        """
+        Book a place for a user in one transaction: a conditional decrement of the
+        remaining places, then the insert into participant_events whose primary key
+        rejects a second registration. Returns REGISTERED, ALREADY_REGISTERED or SOLD_OUT.
+        """
+        events = cls.__table__
+        try:
+            reserved = db.session.execute(
+                events.update()
+                .where(events.c._id == event_id)
+                .where(events.c.remaining_places > 0)
+                .values(remaining_places=events.c.remaining_places - 1)
+            ).rowcount
+            if not reserved:
+                db.session.rollback()
+                if cls.has_participant(event_id, user_id):
+                    return ALREADY_REGISTERED
+                cls.mark_sold_out(event_id)
+                return SOLD_OUT
+            db.session.execute(
+                participant_events.insert().values(user_id=user_id, event_id=event_id))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return ALREADY_REGISTERED
+        cls.changed()
+        return REGISTERED
+
+    @classmethod
+    def register_participants(cls, pairs) -> list:
+        """
+        Book places for a list of (event_id, user_id) pairs in one transaction and
+        return the status of each pair, in order: REGISTERED, ALREADY_REGISTERED,
+        SOLD_OUT, EVENT_NOT_FOUND or USER_NOT_FOUND.
+
+        The events are locked in the order of their ids, so that concurrent batches
+        cannot deadlock, then the users and the existing registrations are checked
+        with one query each and the new ones inserted with a single statement.
+        """
+        events = cls.__table__
+        event_ids = sorted({event_id for event_id, user_id in pairs})
+        user_ids = {user_id for event_id, user_id in pairs}
+        remaining = dict(db.session.execute(
+            select([events.c._id, events.c.remaining_places])
+            .where(events.c._id.in_(event_ids))
+            .where(events.c.active.is_(True))
+            .where(events.c.allow.is_(True))
+            .where(events.c.deleted.is_(False))
+            .order_by(events.c._id)
+            .with_for_update()
+        ).fetchall())
+        users = {
+            row._id for row in db.session.query(UserModel._id)
+            .filter(UserModel._id.in_(user_ids))
+            .filter_by(active=True).filter_by(deleted=False)
+        }
+        registered = set(db.session.execute(
+            select([participant_events.c.event_id, participant_events.c.user_id])
+            .where(participant_events.c.event_id.in_(event_ids))
+            .where(participant_events.c.user_id.in_(user_ids))
+        ).fetchall())
+
+        statuses, taken = [], {}
+        for event_id, user_id in pairs:
+            if event_id not in remaining:
+                status = EVENT_NOT_FOUND
+            elif user_id not in users:
+                status = USER_NOT_FOUND
+            elif (event_id, user_id) in registered:
+                status = ALREADY_REGISTERED
+            elif remaining[event_id] <= 0:
+                status = SOLD_OUT
+            else:
+                status = REGISTERED
+                registered.add((event_id, user_id))
+                remaining[event_id] -= 1
+                taken[event_id] = taken.get(event_id, 0) + 1
+            statuses.append(status)
+
+        if taken:
+            insert_ignore(participant_events, [
+                {'event_id': event_id, 'user_id': user_id}
+                for (event_id, user_id), status in zip(pairs, statuses) if status == REGISTERED
+            ])
+            db.session.execute(
+                events.update()
+                .where(events.c._id == bindparam('event_id'))
+                .values(remaining_places=events.c.remaining_places - bindparam('taken')),
+                [{'event_id': event_id, 'taken': count} for event_id, count in taken.items()]
+            )
+        db.session.commit()
+
+        for event_id in taken:
+            if not remaining[event_id]:
+                cls.mark_sold_out(event_id)
+        if taken:
+            cls.changed()
+        return statuses
+
+    @classmethod
+    def unregister_participant(cls, event_id: int, user_id: int) -> bool:
+        """
+        Cancel a registration in one transaction. The place goes to the head of the
+        waitlist if anyone is waiting, otherwise back to the remaining places.
+        The event row is locked first, in the same order as `register_participant`.
+        """
+        events = cls.__table__
+        db.session.execute(
+            select([events.c._id]).where(events.c._id == event_id).with_for_update())
+        removed = db.session.execute(
+            participant_events.delete()
+            .where(participant_events.c.event_id == event_id)
+            .where(participant_events.c.user_id == user_id)
+        ).rowcount
+        if not removed:
+            db.session.rollback()
+            return False
+
+        promoted = cls._promote(event_id, 1)
+        # Always updated, to bump the version read by the ETags even when the place
+        # went to the waitlist.
+        db.session.execute(
+            events.update()
+            .where(events.c._id == event_id)
+            .values(remaining_places=events.c.remaining_places + 1 - promoted)
+        )
+        db.session.commit()
+        if not promoted:
+            cls.clear_sold_out(event_id)
+        cls.changed()
+        return True
+
+    @classmethod
+    def lock(cls, event_id: int):
+        """
+        Lock the row of a published event until the end of the transaction and return
+        its remaining places, None when there is no such event.
+        """
+        events = cls.__table__
+        row = db.session.execute(
+            select([events.c.remaining_places])
+            .where(events.c._id == event_id)
+            .where(events.c.active.is_(True))
+            .where(events.c.allow.is_(True))
+            .where(events.c.deleted.is_(False))
+            .with_for_update()
+        ).first()
+        return None if row is None else row.remaining_places
+
+    @classmethod
+    def _promote(cls, event_id: int, places: int) -> int:
+        """
+        Register the heads of the waitlist of an event in up to `places` freed places,
+        without committing, and return how many were registered. The event row must be
+        locked. Entries of users registered meanwhile are dropped.
+        """
+        promoted = 0
+        while promoted < places:
+            entry = WaitlistModel.pop_first(event_id)
+            if entry is None:
+                break
+            if not cls.has_participant(event_id, entry.user_id):
+                db.session.execute(participant_events.insert().values(
+                    user_id=entry.user_id, event_id=event_id))
+                promoted += 1
+        return promoted
+
+    def update_places(self, available_places: int) -> None:
+        """
+        Change the number of places of the event, without committing. The remaining
+        places are what the participants leave, and the places it frees go to the
+        waitlist first. The event row is locked first, as for the registrations.
+        """
+        events = self.__table__
+        db.session.execute(
+            select([events.c._id]).where(events.c._id == self._id).with_for_update())
+        taken = db.session.execute(
+            select([func.count()]).select_from(participant_events)
+            .where(participant_events.c.event_id == self._id)
+        ).scalar()
+        free = max(available_places - taken, 0)
+        self.available_places = available_places
+        self.remaining_places = free - self._promote(self._id, free)
+
+    @classmethod
+    def is_sold_out(cls, event_id: int) -> bool:
+        """ Tell from the cache, without touching the database, if an event is full. """
+        return bool(cache.get(f"sold_out:{event_id}"))
+
+    @classmethod
+    def mark_sold_out(cls, event_id: int) -> None:
+        """
+        Remember that an event is full for SOLD_OUT_TTL seconds, which bounds how long
+        a worker may miss a place freed on another one.
+        """
+        cache.set(f"sold_out:{event_id}", True, current_app.config['SOLD_OUT_TTL'])
+
+    @classmethod
+    def clear_sold_out(cls, event_id: int) -> None:
+        cache.delete(f"sold_out:{event_id}")
@@ -0,0 +1,199 @@
+from db import db
+from datetime import datetime, timedelta
+from models.event import EventModel
+from models.organizer import OrganizerModel
+from models.user import UserModel
+from utils import format_datetime, remove_file_upload
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+# Dead letters: jobs that failed IMAGE_JOB_MAX_ATTEMPTS times, kept for inspection.
+DEAD = 'dead'
+
+# Image status of the models while a new image is processed.
+IMAGE_PENDING = 'pending'
+IMAGE_READY = 'ready'
+IMAGE_FAILED = 'failed'
+
+# Upload folder -> model, image column and image status column.
+TARGETS = {
+    'event': (EventModel, 'image', 'image_status'),
+    'client': (UserModel, 'photo', 'photo_status'),
+    'organizer': (OrganizerModel, 'photo', 'photo_status'),
+}
+
+
+class ImageJobModel(db.Model):
+    """
+    Processing of an uploaded image, queued by the request and run by
+    `manage.py image_worker`. Once done, the image replaces the one of its target.
+    """
+    __tablename__ = 'image_jobs'
+    __table_args__ = (
+        db.Index('ix_image_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    _id = db.Column(db.Integer, primary_key=True)
+    folder = db.Column(db.String(20), nullable=False)
+    filename = db.Column(db.String(120), nullable=False)
+    target_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(10), default=PENDING, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.String(255))
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __init__(self, folder, filename, target_id):
+        self.folder = folder
+        self.filename = filename
+        self.target_id = target_id
+
+    def json(self):
+        return {
+            '_id': self._id,
+            'folder': self.folder,
+            'filename': self.filename,
+            'target_id': self.target_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'run_after': format_datetime(self.run_after),
+            'created_at': format_datetime(self.created_at),
+            'updated_at': format_datetime(self.updated_at)
+        }
+
+    @classmethod
+    def enqueue(cls, folder: str, filename: str, target):
+        """ Queue the processing of an image stored for `target` and mark it pending. """
+        model, column, status_column = TARGETS[folder]
+        setattr(target, status_column, IMAGE_PENDING)
+        job = cls(folder, filename, target._id)
+        db.session.add(target)
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    @classmethod
+    def abandon(cls, folder: str, filename: str) -> None:
+        """
+        Release an upload whose job could not be queued, the request having failed
+        before, so that its reference and file do not leak. The failed transaction is
+        rolled back first, it may hold locks.
+        """
+        db.session.rollback()
+        remove_file_upload(filename, folder)
+
+    @classmethod
+    def claim(cls, limit: int) -> list:
+        """
+        Take up to `limit` due jobs for this worker. The conditional update lets
+        several workers share the queue without running a job twice.
+        """
+        now = datetime.utcnow()
+        candidates = [
+            row._id for row in db.session.query(cls._id)
+            .filter_by(status=PENDING).filter(cls.run_after <= now)
+            .order_by(cls.run_after, cls._id).limit(limit)
+        ]
+        claimed = []
+        for _id in candidates:
+            taken = cls.query.filter_by(_id=_id, status=PENDING).update(
+                {'status': RUNNING, 'updated_at': now}, synchronize_session=False)
+            if taken:
+                claimed.append(_id)
+        db.session.commit()
+        return cls.query.filter(cls._id.in_(claimed)).order_by(cls._id).all() if claimed else []
+
+    @classmethod
+    def release_stale(cls, timeout: int) -> int:
+        """ Put back in the queue the jobs of workers that died while running them. """
+        released = cls.query.filter_by(status=RUNNING).filter(
+            cls.updated_at < datetime.utcnow() - timedelta(seconds=timeout)
+        ).update({'status': PENDING}, synchronize_session=False)
+        db.session.commit()
+        return released
+
+    @classmethod
+    def find_dead(cls) -> list:
+        return cls.query.filter_by(status=DEAD).order_by(cls._id).all()
+
+    def target(self):
+        model, column, status_column = TARGETS[self.folder]
+        return model.query.get(self.target_id)
+
+    def superseded(self) -> bool:
+        """ Tell if a newer image of the same target is already in place. """
+        return db.session.query(
+            ImageJobModel.query.filter_by(
+                folder=self.folder, target_id=self.target_id, status=DONE
+            ).filter(ImageJobModel._id > self._id).exists()
+        ).scalar()
+
+    def complete(self):
+        """
+        Put the processed image on its target and return the file it replaces,
+        None when there is none. Returns the job's own file when it is superseded
+        or its target is gone, since nothing uses it then.
+        """
+        model, column, status_column = TARGETS[self.folder]
+        target = self.target()
+        replaced = self.filename
+        if target is not None and not self.superseded():
+            replaced = getattr(target, column)
+            setattr(target, column, self.filename)
+            setattr(target, status_column, IMAGE_READY)
+        self.status = DONE
+        self.last_error = None
+        db.session.add(self)
+        if target is not None:
+            target.save()
+        else:
+            db.session.commit()
+        return replaced
+
+    def fail(self, error: str, max_attempts: int, backoff: int) -> bool:
+        """
+        Record a failed attempt and schedule the next one, with an exponential
+        backoff, or move the job to the dead letters. Returns True when it is dead.
+        """
+        self.attempts += 1
+        self.last_error = error[:255]
+        if self.attempts >= max_attempts:
+            self.status = DEAD
+            model, column, status_column = TARGETS[self.folder]
+            target = self.target()
+            if target is not None and not self.superseded():
+                setattr(target, status_column, IMAGE_FAILED)
+                db.session.add(target)
+        else:
+            self.status = PENDING
+            self.run_after = datetime.utcnow() + timedelta(
+                seconds=backoff * 2 ** (self.attempts - 1))
+        db.session.add(self)
+        db.session.commit()
+        return self.status == DEAD
+
+    def release(self):
+        """ Put back in the queue a job whose worker died, without counting an attempt. """
+        self.status = PENDING
+        db.session.add(self)
+        db.session.commit()
+
+    def discard(self):
+        """
+        Delete a dead job, and the upload it holds a reference to, since a dead job
+        keeps its file until then so that it can be requeued.
+        """
+        db.session.delete(self)
+        db.session.commit()
+        remove_file_upload(self.filename, self.folder)
+
+    def requeue(self):
+        """ Give a dead job a new series of attempts, with the upload it still holds. """
+        self.status = PENDING
+        self.attempts = 0
+        self.run_after = datetime.utcnow()
+        db.session.add(self)
+        db.session.commit()
@@ -1,11 +1,18 @@
 from db import db
 from datetime import datetime
 from werkzeug.security import generate_password_hash
-from utils import json_dump_, generate_uuid
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+from models.event import EventModel
+from utils import format_datetime, generate_uuid
+from utils.pagination import DEFAULT_PAGE_SIZE, keyset_page, keyset_query
 
 
 class OrganizerModel(db.Model):
     __tablename__ = 'organizers'
+    __table_args__ = (
+        db.Index('ix_organizers_active', 'active', '_id'),
+    )
 
     _id = db.Column(db.Integer, primary_key=True)
     _uuid = db.Column(db.String(11), unique=True, default=f"or_{generate_uuid()}")
@@ -14,10 +21,14 @@ class OrganizerModel(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(120), nullable=False)
     photo = db.Column(db.String(120))
+    # pending while a new photo is processed, see models.image_job.
+    photo_status = db.Column(db.String(10))
     active = db.Column(db.Boolean, default=True, nullable=False)
     events = db.relationship('EventModel', lazy=True, cascade='all,delete')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
+    version = db.Column(
+        db.Integer, default=1, onupdate=db.literal_column('version + 1'), nullable=False)
 
     def __init__(self, name, contacts, email, password, photo):
         self.name = name
@@ -26,18 +37,27 @@ class OrganizerModel(db.Model):
         self.password = generate_password_hash(password)
         self.photo = photo
 
-    def json(self):
-        return {
+    def json(self, depth=2):
+        """
+        Use to format the organizer object in json.
+
+        depth 0 leaves the events out, 1 adds their summary and 2 their participants.
+        """
+        data = {
             '_id': self._id,
             'name': self.name,
             'contacts': self.contacts,
             'email': self.email,
             'photo': self.photo,
+            'photo_status': self.photo_status,
             'active': self.active,
-            'events': [event.json() for event in self.events],
-            'created_at': json_dump_(self.created_at),
-            'updated_at': json_dump_(self.updated_at),
+            'created_at': format_datetime(self.created_at),
+            'updated_at': format_datetime(self.updated_at),
         }
+        if depth > 0:
+            view = 'summary' if depth == 1 else 'full'
+            data['events'] = [event.json(view=view) for event in self.events]
+        return data
 
     @classmethod
     def find_by_email(cls, email: str, active=True):
@@ -57,6 +77,76 @@ class OrganizerModel(db.Model):
         """ Find all organizerd in the database. """
         return cls.query.filter_by(active=active).all()
 
+    @classmethod
+    def with_depth(cls, query, depth=2):
+        """
+        Load the events `json(depth)` will read with one query per level,
+        whatever the number of organizers.
+        """
+        if depth == 1:
+            return query.options(
+                selectinload(cls.events).undefer(EventModel.participants_count))
+        if depth > 1:
+            return query.options(
+                selectinload(cls.events).selectinload(EventModel.participants))
+        return query
+
+    @classmethod
+    def id_query(cls, _id: int, active=True):
+        return cls.query.filter_by(_id=_id).filter_by(active=active)
+
+    @classmethod
+    def find_with_events(cls, _id: int, depth=2, active=True):
+        """ Find a organizer by his ID along with the events of the given depth. """
+        return cls.with_depth(cls.id_query(_id, active), depth).first()
+
+    @classmethod
+    def page_query(cls, cursor=None, limit=DEFAULT_PAGE_SIZE, active=True):
+        """ Query of one page of organizers, newest first, with its sort columns. """
+        columns = (cls._id,)
+        return keyset_query(cls.query.filter_by(active=active), columns, cursor, limit), columns
+
+    @classmethod
+    def find_page(cls, cursor=None, limit=DEFAULT_PAGE_SIZE, depth=2, active=True):
+        """ Find one page of organizers, newest first, and the cursor of the next page. """
+        page, columns = cls.page_query(cursor, limit, active)
+        return keyset_page(cls.with_depth(page, depth).all(), columns, limit)
+
+    @classmethod
+    def export_query(cls, batch_size: int, depth=2, active=True):
+        """
+        All the organizers, loaded `batch_size` rows at a time with the events of
+        the given depth, for streamed exports.
+        """
+        query = cls.query.filter_by(active=active).order_by(cls._id)
+        return cls.with_depth(query, depth).yield_per(batch_size)
+
+    @classmethod
+    def validators(cls, query, depth=2):
+        """
+        Fingerprint of the organizers of `query` and, from depth 1, of their events:
+        the organizers versions plus one count, version sum and latest id per
+        organizer, and at depth 2 the participants of the events, so nothing is
+        serialized to validate. There is no last modification, which an event or
+        organizer leaving the response would not move.
+        """
+        rows = query.with_entities(cls._id, cls.version).all()
+        fingerprint = [(row._id, row.version) for row in rows]
+        if depth > 0 and rows:
+            events = db.session.query(
+                EventModel.organizer_id,
+                func.count(EventModel._id),
+                func.max(EventModel._id),
+                func.sum(EventModel.version)
+            ).filter(
+                EventModel.organizer_id.in_([row._id for row in rows])
+            ).group_by(EventModel.organizer_id).order_by(EventModel.organizer_id).all()
+            fingerprint += [tuple(aggregate) for aggregate in events]
+        if depth > 1 and rows:
+            fingerprint += EventModel.participants_validators(select(EventModel._id).where(
+                EventModel.organizer_id.in_([row._id for row in rows])))
+        return tuple(fingerprint)
+
     @classmethod
     def find_without_active(cls, _id: int):
         """ Find an organizer by its ID without relying on the active property in the database."""
@@ -71,3 +161,4 @@ class OrganizerModel(db.Model):
         """ Delete an existing organizer from database. """
         db.session.delete(self)
         db.session.commit()
+        EventModel.changed()
@@ -1,23 +1,122 @@
 from db import db
-from datetime import datetime
-from utils import json_dump_
+from cache import cache
+from datetime import datetime, timezone
+from flask import current_app
+import time
+from utils import format_datetime
+from utils.metrics import registry
+
+# Cache key of the last purge run, whichever process ran it.
+LAST_PURGE = 'token_purge:last'
+
+
+def _last_purge(field):
+    last = cache.get(LAST_PURGE)
+    return last[field] if last else None
+
+
+revoked_rows = registry.counter(
+    'token_blocklist_revoked_total', 'Rows added to token_block_list by the logouts.')
+purged_rows = registry.counter(
+    'token_blocklist_purged_total', 'Expired rows deleted from token_block_list.')
+last_purge_rows = registry.gauge(
+    'token_blocklist_last_purge_rows', 'Rows deleted by the last purge run.',
+    callback=lambda: _last_purge('rows'))
+last_purge_time = registry.gauge(
+    'token_blocklist_last_purge_timestamp_seconds', 'Time of the last purge run.',
+    callback=lambda: _last_purge('at'))
+table_rows = registry.gauge(
+    'token_blocklist_rows', 'Rows left in token_block_list by the last purge run.',
+    callback=lambda: _last_purge('left'))
 
 
 class TokenBlockList(db.Model):
     _id = db.Column(db.Integer, primary_key=True)
     jti = db.Column(db.String(36), unique=True, nullable=False)
+    exp = db.Column(db.DateTime, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    def __init__(self, jti):
+    def __init__(self, jti, exp=None):
         self.jti = jti
+        if exp is not None:
+            self.exp = datetime.utcfromtimestamp(exp)
 
     def json(self):
-        return {'_id': self._id, 'jti': self.jti, 'created_at': json_dump_(self.created_at)}
+        return {
+            '_id': self._id,
+            'jti': self.jti,
+            'exp': format_datetime(self.exp),
+            'created_at': format_datetime(self.created_at)
+        }
 
     def save(self):
+        """ Revoke the token and record it in the revocation cache. """
         db.session.add(self)
         db.session.commit()
+        revoked_rows.inc()
+        exp = self.exp.replace(tzinfo=timezone.utc).timestamp() if self.exp else None
+        self.cache_revocation(self.jti, True, exp)
 
     @classmethod
     def find_by_jti(cls, jti):
         return cls.query.filter_by(jti=jti).scalar()
+
+    @classmethod
+    def is_revoked(cls, jti, exp=None) -> bool:
+        """ Tell if a token is revoked, hitting the database only on a cache miss. """
+        revoked = cache.get(f"revoked:{jti}")
+        if revoked is None:
+            revoked = cls.find_by_jti(jti=jti) is not None
+            cls.cache_revocation(jti, revoked, exp)
+        return revoked
+
+    @classmethod
+    def cache_revocation(cls, jti, revoked: bool, exp=None):
+        """
+        Cache the revocation state of a token until it expires, and never longer than
+        JWT_ACCESS_TOKEN_EXPIRES. Unrevoked tokens are only cached for
+        REVOCATION_NEGATIVE_TTL seconds since a logout on another worker can revoke them.
+        """
+        ttl = current_app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds()
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if not revoked:
+            ttl = min(ttl, current_app.config['REVOCATION_NEGATIVE_TTL'])
+        if ttl > 0:
+            cache.set(f"revoked:{jti}", revoked, ttl)
+
+    @classmethod
+    def count(cls) -> int:
+        return db.session.query(db.func.count(cls._id)).scalar()
+
+    @classmethod
+    def purge_expired(cls, batch_size=1000) -> int:
+        """
+        Delete the rows of expired tokens, `batch_size` rows per transaction so that
+        no lock is held for long. Rows revoked before `exp` was recorded are kept
+        as long as a refresh token could still be valid.
+        """
+        now = datetime.utcnow()
+        expired = cls.exp < now
+        refresh_expires = current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+        if refresh_expires:
+            expired = db.or_(
+                expired,
+                db.and_(cls.exp.is_(None), cls.created_at < now - refresh_expires)
+            )
+
+        purged = 0
+        while True:
+            ids = [row._id for row in db.session.query(cls._id).filter(expired).limit(batch_size)]
+            if not ids:
+                break
+            cls.query.filter(cls._id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            purged += len(ids)
+            if len(ids) < batch_size:
+                break
+
+        purged_rows.inc(purged)
+        # Counted here, once per run, rather than by every scrape.
+        cache.set(LAST_PURGE, {'rows': purged, 'at': time.time(), 'left': cls.count()})
+        return purged
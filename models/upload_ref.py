@@ -0,0 +1,76 @@
+from db import db, insert_ignore
+from datetime import datetime
+from utils import format_datetime
+from utils.metrics import registry
+
+deduplicated = registry.counter(
+    'upload_deduplicated_total', 'Uploads whose content was already stored.')
+
+
+class UploadRefModel(db.Model):
+    """
+    Reference count of a content addressed upload: the models and image jobs
+    using it. The file is deleted with its last reference.
+
+    The counts are updated in their own transaction, on the primary, so that the
+    row lock is held while the file is placed or deleted and a concurrent upload
+    of the same content never loses its file.
+    """
+    __tablename__ = 'upload_refs'
+
+    folder = db.Column(db.String(20), primary_key=True)
+    filename = db.Column(db.String(120), primary_key=True)
+    refs = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def json(self):
+        return {
+            'folder': self.folder,
+            'filename': self.filename,
+            'refs': self.refs,
+            'created_at': format_datetime(self.created_at)
+        }
+
+    @classmethod
+    def _where(cls, folder: str, filename: str):
+        return db.and_(cls.folder == folder, cls.filename == filename)
+
+    @classmethod
+    def acquire(cls, folder: str, filename: str, place) -> None:
+        """
+        Add a reference to an upload and call `place()` to put its file in place while
+        the row is locked. `place` returns True when the content was already stored.
+        """
+        table = cls.__table__
+        with db.engine.begin() as connection:
+            insert_ignore(table, [{
+                'folder': folder, 'filename': filename, 'refs': 0, 'created_at': datetime.utcnow()
+            }], connection)
+            connection.execute(
+                table.update().where(cls._where(folder, filename)).values(refs=table.c.refs + 1))
+            stored = place()
+        if stored:
+            deduplicated.inc(folder=folder)
+
+    @classmethod
+    def release(cls, folder: str, filename: str, remove) -> bool:
+        """
+        Drop a reference to an upload and call `remove()` when it was the last one,
+        or when the upload has no count, being older than the content addressing.
+        Returns True when it was removed.
+        """
+        table = cls.__table__
+        with db.engine.begin() as connection:
+            counted = connection.execute(
+                table.update().where(cls._where(folder, filename)).values(refs=table.c.refs - 1)
+            ).rowcount
+            unreferenced = not counted or connection.execute(
+                table.delete().where(cls._where(folder, filename)).where(table.c.refs <= 0)
+            ).rowcount
+            if unreferenced:
+                remove()
+        return bool(unreferenced)
+
+    @classmethod
+    def find(cls, folder: str, filename: str):
+        return cls.query.get((folder, filename))
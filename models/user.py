@@ -1,7 +1,12 @@
-from db import db
+from db import db, insert_ignore
 from datetime import datetime
 from werkzeug.security import generate_password_hash
-from utils import json_dump_, generate_uuid
+from sqlalchemy.orm import selectinload
+from schema.event import events_schema
+from utils import format_datetime, generate_uuid
+
+FAVOURITE_ADDED = 'added'
+ALREADY_FAVOURITE = 'already_favourite'
 
 favourite_events = db.Table(
     'favourite_events',
@@ -17,6 +22,9 @@ favourite_events = db.Table(
 class UserModel(db.Model):
     """ User model class to easily manage user data. """
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_active_deleted', 'active', 'deleted', '_id'),
+    )
 
     _id = db.Column(db.Integer, primary_key=True)
     _uuid = db.Column(db.String(11), unique=True, default=f"us_{generate_uuid()}")
@@ -26,6 +34,8 @@ class UserModel(db.Model):
     password = db.Column(db.String(120), nullable=False)
     contacts = db.Column(db.String(120), nullable=False)
     photo = db.Column(db.String(120))
+    # pending while a new photo is processed, see models.image_job.
+    photo_status = db.Column(db.String(10))
 
     favourite_events = db.relationship(
         'EventModel', secondary=favourite_events, lazy='subquery')
@@ -34,6 +44,9 @@ class UserModel(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime)
     deleted = db.Column(db.Boolean, default=False, nullable=False)
+    # Bumped by every UPDATE of the row: the ETags of the events and organizers embedding the user.
+    version = db.Column(
+        db.Integer, default=1, onupdate=db.literal_column('version + 1'), nullable=False)
 
     def __init__(self, firstname, lastname, email, password, contacts, photo):
         self.firstname = firstname
@@ -44,9 +57,6 @@ class UserModel(db.Model):
         self.photo = photo
 
     def json(self):
-        from schema.event import EventSchema
-        events_schema = EventSchema(many=True)
-
         return {
             '_id': self._id,
             'firstname': self.firstname,
@@ -54,11 +64,12 @@ class UserModel(db.Model):
             'email': self.email,
             'contacts': self.contacts,
             'photo': self.photo,
+            'photo_status': self.photo_status,
             'favourite_events': events_schema.dump(self.favourite_events),
             'active': self.active,
             'deleted': self.deleted,
-            'created_at': json_dump_(self.created_at),
-            'updated_at': json_dump_(self.updated_at)
+            'created_at': format_datetime(self.created_at),
+            'updated_at': format_datetime(self.updated_at)
         }
 
     @classmethod
@@ -94,15 +105,43 @@ class UserModel(db.Model):
         """ Find all user in the database. """
         return cls.query.filter_by(active=active).filter_by(deleted=False).all()
 
+    @classmethod
+    def export_query(cls, batch_size: int, active=True):
+        """
+        All the users, loaded `batch_size` rows at a time with their favourite events,
+        for streamed exports.
+        """
+        return cls.query.filter_by(active=active).filter_by(deleted=False).options(
+            selectinload(cls.favourite_events)
+        ).order_by(cls._id).yield_per(batch_size)
+
     def save(self):
         """ Save new user into database. """
         db.session.add(self)
         db.session.commit()
+        if self.is_participant():
+            self.changed()
 
     def delete(self):
         """ Delete an existing user from database. """
+        participant = self.is_participant()
         db.session.delete(self)
         db.session.commit()
+        if participant:
+            self.changed()
+
+    def is_participant(self) -> bool:
+        from models.event import participant_events
+        return db.session.query(
+            db.session.query(participant_events).filter(
+                participant_events.c.user_id == self._id).exists()
+        ).scalar()
+
+    @classmethod
+    def changed(cls):
+        """ Drop the cached events responses, whose full view embeds the participants. """
+        from models.event import EventModel
+        EventModel.changed()
 
     def add_favourite(self, event):
         self.favourite_events.append(event)
@@ -112,3 +151,48 @@ class UserModel(db.Model):
     def remove_favourite(self, event):
         self.favourite_events.remove(event)
         db.session.commit()
+
+    @classmethod
+    def add_favourites(cls, pairs) -> list:
+        """
+        Add a list of (user_id, event_id) pairs to the favourites in one transaction
+        and return the status of each pair, in order: FAVOURITE_ADDED,
+        ALREADY_FAVOURITE, EVENT_NOT_FOUND or USER_NOT_FOUND. The pairs are checked
+        with one query per table and inserted with a single statement.
+        """
+        from models.event import EventModel, EVENT_NOT_FOUND, USER_NOT_FOUND
+
+        user_ids = {user_id for user_id, event_id in pairs}
+        event_ids = {event_id for user_id, event_id in pairs}
+        users = {
+            row._id for row in db.session.query(cls._id)
+            .filter(cls._id.in_(user_ids)).filter_by(active=True).filter_by(deleted=False)
+        }
+        events = {
+            row._id for row in db.session.query(EventModel._id)
+            .filter(EventModel._id.in_(event_ids))
+            .filter_by(active=True).filter_by(allow=True).filter_by(deleted=False)
+        }
+        favourites = set(db.session.execute(
+            db.select([favourite_events.c.user_id, favourite_events.c.event_id])
+            .where(favourite_events.c.user_id.in_(user_ids))
+            .where(favourite_events.c.event_id.in_(event_ids))
+        ).fetchall())
+
+        statuses, rows = [], []
+        for user_id, event_id in pairs:
+            if user_id not in users:
+                status = USER_NOT_FOUND
+            elif event_id not in events:
+                status = EVENT_NOT_FOUND
+            elif (user_id, event_id) in favourites:
+                status = ALREADY_FAVOURITE
+            else:
+                status = FAVOURITE_ADDED
+                favourites.add((user_id, event_id))
+                rows.append({'user_id': user_id, 'event_id': event_id})
+            statuses.append(status)
+
+        insert_ignore(favourite_events, rows)
+        db.session.commit()
+        return statuses
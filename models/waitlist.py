@@ -0,0 +1,97 @@
+from db import db
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from utils import format_datetime
+
+
+class WaitlistModel(db.Model):
+    """ Users waiting for a place in a sold-out event, served first in, first out. """
+    __tablename__ = 'waitlist'
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'user_id'),
+        db.Index('ix_waitlist_event_id__id', 'event_id', '_id'),
+    )
+
+    _id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events._id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users._id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __init__(self, event_id, user_id):
+        self.event_id = event_id
+        self.user_id = user_id
+
+    def json(self):
+        return {
+            '_id': self._id,
+            'event_id': self.event_id,
+            'user_id': self.user_id,
+            'position': self.position(),
+            'created_at': format_datetime(self.created_at)
+        }
+
+    def position(self) -> int:
+        """ Rank of the entry in the queue of its event, starting at 1. """
+        return self.query.filter_by(
+            event_id=self.event_id).filter(
+            WaitlistModel._id <= self._id).count()
+
+    @classmethod
+    def find_entry(cls, event_id: int, user_id: int):
+        return cls.query.filter_by(event_id=event_id).filter_by(user_id=user_id).first()
+
+    @classmethod
+    def join(cls, event_id: int, user_id: int):
+        """
+        Queue a user for a sold-out event, once. The event row is locked as for the
+        registrations, so that a place freed meanwhile goes to the user instead of
+        leaving him queued. Returns the status, WAITLISTED, REGISTERED,
+        ALREADY_REGISTERED, EVENT_NOT_FOUND or USER_NOT_FOUND, and his entry when queued.
+        """
+        from models.event import (
+            ALREADY_REGISTERED, EVENT_NOT_FOUND, USER_NOT_FOUND, WAITLISTED, EventModel)
+        from models.user import UserModel
+
+        remaining = EventModel.lock(event_id)
+        status = None
+        if remaining is None:
+            status = EVENT_NOT_FOUND
+        elif UserModel.find_by_id(_id=user_id) is None:
+            status = USER_NOT_FOUND
+        elif EventModel.has_participant(event_id, user_id):
+            status = ALREADY_REGISTERED
+        if status:
+            db.session.rollback()
+            return status, None
+        if remaining > 0:
+            # Registered in the transaction holding the lock, the place cannot be taken.
+            status = EventModel.register_participant(event_id, user_id)
+            EventModel.clear_sold_out(event_id)
+            return status, None
+        try:
+            entry = cls(event_id, user_id)
+            db.session.add(entry)
+            db.session.commit()
+            return WAITLISTED, entry
+        except IntegrityError:
+            db.session.rollback()
+            return WAITLISTED, cls.find_entry(event_id, user_id)
+
+    @classmethod
+    def pop_first(cls, event_id: int):
+        """
+        Remove and return the head of the queue of an event, without committing,
+        inside the transaction that frees the place.
+        """
+        entry = cls.query.filter_by(
+            event_id=event_id).order_by(
+            cls._id).with_for_update().first()
+        if entry:
+            db.session.delete(entry)
+            db.session.flush()
+        return entry
+
+    def delete(self):
+        """ Remove an entry from the queue. """
+        db.session.delete(self)
+        db.session.commit()
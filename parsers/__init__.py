@@ -0,0 +1,11 @@
+MAX_BATCH_SIZE = 100
+
+
+def id_pair(first: str, second: str):
+    """ Argument type reading a {first: id, second: id} object into an (id, id) tuple. """
+    def parse(value):
+        try:
+            return int(value[first]), int(value[second])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Un objet {{'{first}': int, '{second}': int}} est attendu.")
+    return parse
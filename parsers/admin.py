@@ -1,4 +1,4 @@
-from flask_restful import reqparse
+from flask_restful import inputs, reqparse
 
 _help = 'Désolé, ce champ est obligatoire'
 post_parser = reqparse.RequestParser()
@@ -23,3 +23,6 @@ login_parser.add_argument('password', type=str, required=True, help=_help)
 
 role_parser = reqparse.RequestParser()
 role_parser.add_argument('role', type=str, required=True, help=_help)
+
+list_parser = reqparse.RequestParser()
+list_parser.add_argument('stream', type=inputs.boolean, default=False, location='args')
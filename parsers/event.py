@@ -1,15 +1,19 @@
-from flask_restful import reqparse
+from flask_restful import reqparse, inputs
 from werkzeug import datastructures
+from parsers import id_pair
+from utils import parse_datetime
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 _help = 'Désolé, ce champ est obligatoire'
+_views = ('summary', 'full')
 post_parser = reqparse.RequestParser()
 post_parser.add_argument('name', type=str, required=True, help=_help)
 post_parser.add_argument('location', type=str, required=True, help=_help)
 post_parser.add_argument('description', type=str)
 post_parser.add_argument('price', type=str)
 post_parser.add_argument('available_places', type=int, required=True, help=_help)
-post_parser.add_argument('start_at', type=str, required=True, help=_help)
-post_parser.add_argument('end_at', type=str, required=True, help=_help)
+post_parser.add_argument('start_at', type=parse_datetime, required=True, help=_help)
+post_parser.add_argument('end_at', type=parse_datetime, required=True, help=_help)
 post_parser.add_argument('image', type=datastructures.FileStorage, location='files')
 post_parser.add_argument('organizer_id', type=int, required=True, help=_help)
 
@@ -22,3 +26,31 @@ active_parser.add_argument('active', type=bool, required=True, help=_help)
 
 allow_parser = reqparse.RequestParser()
 allow_parser.add_argument('allow', type=bool, required=True, help=_help)
+
+list_parser = reqparse.RequestParser()
+list_parser.add_argument('cursor', type=str, location='args')
+list_parser.add_argument(
+    'limit', type=inputs.int_range(1, MAX_PAGE_SIZE),
+    default=DEFAULT_PAGE_SIZE, location='args')
+list_parser.add_argument('location', type=str, location='args')
+list_parser.add_argument('price_min', type=float, location='args')
+list_parser.add_argument('price_max', type=float, location='args')
+list_parser.add_argument('start_from', type=parse_datetime, location='args')
+list_parser.add_argument('start_to', type=parse_datetime, location='args')
+list_parser.add_argument('upcoming', type=inputs.boolean, default=False, location='args')
+list_parser.add_argument('view', choices=_views, default='summary', location='args')
+
+search_parser = reqparse.RequestParser()
+search_parser.add_argument('q', type=str, required=True, help=_help, location='args')
+search_parser.add_argument(
+    'limit', type=inputs.int_range(1, MAX_PAGE_SIZE),
+    default=DEFAULT_PAGE_SIZE, location='args')
+search_parser.add_argument('view', choices=_views, default='summary', location='args')
+
+view_parser = reqparse.RequestParser()
+view_parser.add_argument('view', choices=_views, default='full', location='args')
+
+participants_parser = reqparse.RequestParser()
+participants_parser.add_argument(
+    'registrations', type=id_pair('event_id', 'user_id'), action='append',
+    required=True, location='json', help=_help)
@@ -1,5 +1,6 @@
-from flask_restful import reqparse
+from flask_restful import reqparse, inputs
 from werkzeug import datastructures
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 _help = 'Désolé, ce champ est obligatoire'
 post_parser = reqparse.RequestParser()
 post_parser.add_argument('name', type=str, required=True, help=_help)
@@ -19,3 +20,14 @@ reset_parser.add_argument('confirm_password', type=str, required=True, help=_hel
 login_parser = reqparse.RequestParser()
 login_parser.add_argument('email', type=str, required=True, help=_help)
 login_parser.add_argument('password', type=str, required=True, help=_help)
+
+list_parser = reqparse.RequestParser()
+list_parser.add_argument('cursor', type=str, location='args')
+list_parser.add_argument(
+    'limit', type=inputs.int_range(1, MAX_PAGE_SIZE),
+    default=DEFAULT_PAGE_SIZE, location='args')
+list_parser.add_argument('depth', type=inputs.int_range(0, 2), default=1, location='args')
+list_parser.add_argument('stream', type=inputs.boolean, default=False, location='args')
+
+depth_parser = reqparse.RequestParser()
+depth_parser.add_argument('depth', type=inputs.int_range(0, 2), default=2, location='args')
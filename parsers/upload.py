@@ -0,0 +1,10 @@
+from flask_restful import reqparse
+from utils.images import ORIGINAL, VARIANT_FORMATS, VARIANT_WIDTHS
+
+upload_parser = reqparse.RequestParser()
+upload_parser.add_argument(
+    'size', type=str, choices=(ORIGINAL, *VARIANT_WIDTHS), default=ORIGINAL, location='args')
+upload_parser.add_argument('format', type=str, choices=tuple(VARIANT_FORMATS), location='args')
+# Signed URLs, see `resources.upload.UploadUrl`.
+upload_parser.add_argument('expires', type=int, location='args')
+upload_parser.add_argument('signature', type=str, location='args')
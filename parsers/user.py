@@ -1,5 +1,6 @@
-from flask_restful import reqparse
+from flask_restful import inputs, reqparse
 from werkzeug import datastructures
+from parsers import id_pair
 
 _help = 'Désolé, ce champ est obligatoire'
 post_parser = reqparse.RequestParser()
@@ -21,3 +22,11 @@ reset_parser.add_argument('confirm_password', type=str, required=True, help=help
 login_parser = reqparse.RequestParser()
 login_parser.add_argument('email', type=str, required=True, help=help)
 login_parser.add_argument('password', type=str, required=True, help=help)
+
+list_parser = reqparse.RequestParser()
+list_parser.add_argument('stream', type=inputs.boolean, default=False, location='args')
+
+favourites_parser = reqparse.RequestParser()
+favourites_parser.add_argument(
+    'favourites', type=id_pair('user_id', 'event_id'), action='append',
+    required=True, location='json', help=_help)
@@ -9,8 +9,17 @@ EVENT_ALREADY_EXISTS = "Désolé, cet évènement existe déjà."
 EVENT_SUCCESSFULLY_CREATED = "Votre évènement a été créé avec succès."
 EVENT_SUCCESSFULLY_UPDATED = "Informations mises à jour avec succès."
 EVENT_SUCCESSFULLY_DELETED = "Votre évènement a été supprimé avec succès."
+ALREADY_REGISTERED_ERROR = "Vous êtes déjà inscrit à cet événement."
+WAITLIST_JOINED = "Cet événement est complet, vous êtes sur la liste d'attente."
+NOT_ON_WAITLIST = "Désolé, vous n'êtes pas sur la liste d'attente de cet événement."
+
+INVALID_CURSOR = "Désolé, le curseur de pagination est invalide."
+BATCH_TOO_LARGE = "Désolé, une requête ne peut pas contenir plus de {} éléments."
 
 SERVER_ERROR = "Error! Code: {}, Un problème est survenu. Veuillez contacter le service d'assistance."
 INVALIDCREDENTIALS = "Informations d'identification non valides."
 
 EXTENTION_ERROR = "L'image doit être de type png, jpg ou jpeg."
+UPLOAD_DOES_NOT_EXIST = "Désolé, cette image n'existe pas."
+INVALID_UPLOAD_SIGNATURE = "Le lien de cette image est invalide ou a expiré."
+SIGNED_URLS_DISABLED = "Les liens signés des images ne sont pas activés."
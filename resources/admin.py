@@ -6,7 +6,10 @@ from flask_jwt_extended import (
 )
 
 from models.admin import AdminModel
-from parsers.admin import post_parser, put_parser, reset_parser, login_parser, role_parser
+from models.claims import invalidate_claims
+from parsers.admin import (
+    post_parser, put_parser, reset_parser, login_parser, role_parser, list_parser)
+from utils.streaming import STREAM_BATCH_SIZE, stream_mimetype, stream_response
 from werkzeug.security import check_password_hash, safe_str_cmp, generate_password_hash
 from datetime import datetime
 
@@ -101,6 +104,7 @@ class Admin(Resource):
         if admin and admin.role == 'admin':
             try:
                 admin.delete()
+                invalidate_claims(admin._uuid)
                 return {'message': ACCOUNT_SUCCESSFULLY_DELETED}
             except Exception as e:
                 abort(500, message=SERVER_ERROR.format(type(e).__name__))
@@ -113,6 +117,11 @@ class AdminList(Resource):
     @jwt_required()
     @superuser_required
     def get(cls):
+        args = list_parser.parse_args()
+        mimetype = stream_mimetype(args.stream)
+        if mimetype:
+            admins = AdminModel.export_query(STREAM_BATCH_SIZE)
+            return stream_response('admins', (admin.json() for admin in admins), mimetype)
         return {'admins': [admin.json() for admin in AdminModel.find_all()]}
 
 
@@ -170,6 +179,7 @@ class AdminRole(Resource):
             admin_found.updated_at = datetime.utcnow()
             try:
                 admin_found.save()
+                invalidate_claims(admin_found._uuid)
                 return {'message': ACCOUNT_SUCCESSFULLY_UPDATED}
             except Exception as e:
                 abort(500, message=SERVER_ERROR.format(type(e).__name__))
@@ -1,8 +1,18 @@
-from utils import UPLOAD_FOLDER, remove_file_upload, saveFileUploaded
+from utils import saveFileUploaded
+from flask import request
+from cache import response_cache
 from flask_restful import Resource, abort
-from models.event import EventModel
+from models.event import (
+    EventModel, REGISTERED, ALREADY_REGISTERED, EVENT_NOT_FOUND, USER_NOT_FOUND)
+from models.image_job import ImageJobModel
 from models.user import UserModel
-from parsers.event import post_parser, put_parser, active_parser, allow_parser
+from models.waitlist import WaitlistModel
+from parsers.event import (
+    post_parser, put_parser, active_parser, allow_parser, list_parser,
+    search_parser, view_parser, participants_parser)
+from parsers import MAX_BATCH_SIZE
+from utils.http import conditional, make_etag
+from utils.pagination import InvalidCursor, keyset_page
 from datetime import datetime
 from flask_jwt_extended import jwt_required
 from resources.admin import admin_required
@@ -12,7 +22,46 @@ from resources.user import client_required
 # Messages
 from resources import (
     ACCOUNT_DOES_NOT_EXIST, EVENT_DOES_NOT_EXIST, EVENT_SUCCESSFULLY_DELETED,
-    EVENT_SUCCESSFULLY_UPDATED, EXTENTION_ERROR, SERVER_ERROR)
+    EVENT_SUCCESSFULLY_UPDATED, EXTENTION_ERROR, INVALID_CURSOR, SERVER_ERROR,
+    ALREADY_REGISTERED_ERROR, BATCH_TOO_LARGE, NOT_ON_WAITLIST, WAITLIST_JOINED)
+
+
+def events_page(query):
+    """ Filter and paginate an events query with the listing query string. """
+    args = list_parser.parse_args()
+    query = EventModel.filter_query(
+        query,
+        location=args.location,
+        price_min=args.price_min,
+        price_max=args.price_max,
+        start_from=args.start_from,
+        start_to=args.start_to
+    )
+    try:
+        page, columns = EventModel.page_query(
+            query, args.cursor, args.limit, args.upcoming, args.start_from)
+    except InvalidCursor:
+        abort(400, message=INVALID_CURSOR)
+    fingerprint = EventModel.page_validators(page, args.view)
+
+    def build():
+        events, next_cursor = keyset_page(
+            EventModel.with_view(page, args.view).all(), columns, args.limit)
+        return {
+            'events': [event.json(view=args.view) for event in events],
+            'next_cursor': next_cursor
+        }
+    return conditional(build, make_etag(request.full_path, fingerprint))
+
+
+def event_response(event, view, envelope=False):
+    """ The event, or a 304 when the client copy is still current. """
+    fingerprint, last_modified = event.validators(view)
+
+    def build():
+        data = event.json(view=view)
+        return {'event': data} if envelope else data
+    return conditional(build, make_etag(request.path, view, fingerprint), last_modified)
 
 
 class EventStore(Resource):
@@ -23,15 +72,20 @@ class EventStore(Resource):
     def post(cls):
         data = post_parser.parse_args(strict=True)
         event = EventModel(**data)
+        event.image = None
         if data['image']:
-            response = saveFileUploaded(data['image'], 'event')
-            if response is None:
+            filename = saveFileUploaded(data['image'], 'event')
+            if filename is None:
                 abort(400, message=EXTENTION_ERROR)
-            event.image = response
+        job = None
         try:
             event.save()
+            if data['image']:
+                job = ImageJobModel.enqueue('event', filename, event)
             return event.json(), 201
         except Exception as e:
+            if data['image'] and job is None:
+                ImageJobModel.abandon('event', filename)
             abort(500, SERVER_ERROR.format(type(e).__name__))
 
 
@@ -41,24 +95,44 @@ class EventParticipant(Resource):
     @jwt_required()
     @client_required
     def post(cls, event_id: int, user_id: int):
+        # Known full: straight to the waitlist, which checks the event and the user itself.
+        if EventModel.is_sold_out(event_id):
+            return cls.wait(event_id, user_id)
         event = EventModel.find_by_id(_id=event_id)
-        if event and event.remaining_places > 0:
+        if event:
             participant = UserModel.find_by_id(_id=user_id)
             if participant:
-                event_data = event.json()
-                participants = event_data['participants']
-                participant_exists = [p for p in participants if p['_id'] == user_id]
-                if len(participant_exists) == 0:
-                    try:
-                        event.add_participant(participant)
-                        event.remaining_places -= 1
-                        event.save()
-                        return {"message": "Inscription terminée avec succès."}, 201
-                    except Exception as e:
-                        abort(500, SERVER_ERROR.format(type(e).__name__))
-                abort(400, message='Vous êtes déjà inscrit à cet événement.')
+                try:
+                    status = EventModel.register_participant(event_id, user_id)
+                except Exception as e:
+                    abort(500, message=SERVER_ERROR.format(type(e).__name__))
+                if status == REGISTERED:
+                    return {"message": "Inscription terminée avec succès."}, 201
+                if status == ALREADY_REGISTERED:
+                    abort(400, message=ALREADY_REGISTERED_ERROR)
+                return cls.wait(event_id, user_id)
+            abort(404, message=ACCOUNT_DOES_NOT_EXIST)
+        abort(404, message=EVENT_DOES_NOT_EXIST)
+
+    @classmethod
+    def wait(cls, event_id: int, user_id: int):
+        """
+        Put the user on the waitlist of a sold-out event, or register him if a place
+        was freed meanwhile. Checks that the event and the user exist.
+        """
+        try:
+            status, entry = WaitlistModel.join(event_id, user_id)
+        except Exception as e:
+            abort(500, message=SERVER_ERROR.format(type(e).__name__))
+        if status == REGISTERED:
+            return {"message": "Inscription terminée avec succès."}, 201
+        if status == ALREADY_REGISTERED:
+            abort(400, message=ALREADY_REGISTERED_ERROR)
+        if status == USER_NOT_FOUND:
             abort(404, message=ACCOUNT_DOES_NOT_EXIST)
-        abort(401, message="Désolé, il n'y a plus de places disponibles pour cet événement.")
+        if status == EVENT_NOT_FOUND or entry is None:
+            abort(404, message=EVENT_DOES_NOT_EXIST)
+        return {"message": WAITLIST_JOINED, "position": entry.position()}, 202
 
     @classmethod
     @jwt_required()
@@ -68,31 +142,72 @@ class EventParticipant(Resource):
         if event:
             participant = UserModel.find_by_id(_id=user_id)
             if participant:
-                event_data = event.json()
-                participants = event_data['participants']
-                participant_exists = [p for p in participants if p['_id'] == user_id]
-                if len(participant_exists) > 0:
-                    try:
-                        event.remove_participant(participant)
-                        event.remaining_places += 1
-                        event.save()
-                        return {"message": "Inscription retirée avec succès."}, 201
-                    except Exception as e:
-                        abort(500, message=SERVER_ERROR.format(type(e).__name__))
+                try:
+                    removed = EventModel.unregister_participant(event_id, user_id)
+                except Exception as e:
+                    abort(500, message=SERVER_ERROR.format(type(e).__name__))
+                if removed:
+                    return {"message": "Inscription retirée avec succès."}, 201
                 abort(400, message="Désolé, vous n'êtes pas inscrit à cet événement.")
             abort(404, message=ACCOUNT_DOES_NOT_EXIST)
         abort(404, message=EVENT_DOES_NOT_EXIST)
 
 
+class EventParticipants(Resource):
+    """ /event/participants - Register a batch of users to events"""
+    @classmethod
+    @jwt_required()
+    @client_required
+    def post(cls):
+        data = participants_parser.parse_args(strict=True)
+        pairs = data.registrations
+        if len(pairs) > MAX_BATCH_SIZE:
+            abort(400, message=BATCH_TOO_LARGE.format(MAX_BATCH_SIZE))
+        try:
+            statuses = EventModel.register_participants(pairs)
+        except Exception as e:
+            abort(500, message=SERVER_ERROR.format(type(e).__name__))
+        return {'registrations': [
+            {'event_id': event_id, 'user_id': user_id, 'status': status}
+            for (event_id, user_id), status in zip(pairs, statuses)
+        ]}
+
+
+class EventWaitlist(Resource):
+    """ /event/waitlist/<event_id>/<user_id>"""
+    @classmethod
+    @jwt_required()
+    @client_required
+    def get(cls, event_id: int, user_id: int):
+        entry = WaitlistModel.find_entry(event_id, user_id)
+        if not entry:
+            abort(404, message=NOT_ON_WAITLIST)
+        return entry.json()
+
+    @classmethod
+    @jwt_required()
+    @client_required
+    def delete(cls, event_id: int, user_id: int):
+        entry = WaitlistModel.find_entry(event_id, user_id)
+        if entry:
+            try:
+                entry.delete()
+                return {"message": "Vous avez quitté la liste d'attente."}
+            except Exception as e:
+                abort(500, message=SERVER_ERROR.format(type(e).__name__))
+        abort(404, message=NOT_ON_WAITLIST)
+
+
 class Event(Resource):
     @classmethod
     @jwt_required()
     def get(cls, _id: int):
         """ /event/<id> - Get event."""
+        args = view_parser.parse_args()
         event = EventModel.find_by_id(_id=_id)
         if not event:
             abort(404, message=EVENT_DOES_NOT_EXIST)
-        return event.json()
+        return event_response(event, args.view)
 
     @classmethod
     @jwt_required()
@@ -101,28 +216,33 @@ class Event(Resource):
         """ /event/<id> - Update event."""
         event = EventModel.find_without_active(_id=_id)
         if event:
-            existing_image = event.image
             data = put_parser.parse_args(strict=True)
             event.name = data.name
             event.location = data.location
             event.description = data.description
             event.price = data.price
-            event.available_places = data.available_places
-            event.remaining_places = data.available_places
             event.start_at = data.start_at
             event.end_at = data.end_at
             if data['image']:
-                response = saveFileUploaded(data['image'], 'event')
-                if response is None:
+                filename = saveFileUploaded(data['image'], 'event')
+                if filename is None:
                     abort(400, message=EXTENTION_ERROR)
-                event.image = response
-                remove_file_upload(f"{UPLOAD_FOLDER}/event/{existing_image}")
             event.active = data.active
             event.updated_at = datetime.utcnow()
+            job = None
             try:
+                event.update_places(data.available_places)
                 event.save()
+                if data['image']:
+                    job = ImageJobModel.enqueue('event', filename, event)
+                if event.remaining_places:
+                    EventModel.clear_sold_out(event._id)
+                else:
+                    EventModel.mark_sold_out(event._id)
                 return {'message': EVENT_SUCCESSFULLY_UPDATED}
             except Exception as e:
+                if data['image'] and job is None:
+                    ImageJobModel.abandon('event', filename)
                 abort(500, message=SERVER_ERROR.format(type(e).__name__))
         abort(400, message=EVENT_DOES_NOT_EXIST)
 
@@ -165,14 +285,25 @@ class EventPublishedList(Resource):
     """ /events - Get published events"""
     @classmethod
     def get(cls):
-        return {'events': [event.json() for event in EventModel.find_all()]}
+        return response_cache.cached(
+            'events', lambda: events_page(EventModel.published_query()))
 
 
 class EventUnpublishedList(Resource):
     """ /events/unpublished - Get unpublished events """
     @classmethod
     def get(cls):
-        return {'events': [event.json() for event in EventModel.find_all(active=False)]}
+        return response_cache.cached(
+            'events', lambda: events_page(EventModel.published_query(active=False)))
+
+
+class EventSearch(Resource):
+    """ /events/search - Search the published events by name, location and description"""
+    @classmethod
+    def get(cls):
+        args = search_parser.parse_args()
+        events = EventModel.search(args.q, limit=args.limit, view=args.view)
+        return {'events': [event.json(view=args.view) for event in events]}
 
 
 class EventAuthorization(Resource):
@@ -198,14 +329,18 @@ class EventUnauthorizedList(Resource):
     """ /events/unauthorized - Get unauthorized events"""
     @classmethod
     def get(cls):
-        return {'events': [event.json() for event in EventModel.find_allow(False)]}
+        return response_cache.cached(
+            'events', lambda: events_page(EventModel.allow_query(allow=False)))
 
 
 class AllEvent(Resource):
     """ /events/_id """
     @classmethod
     def get(cls, _id):
-        event = EventModel.find_without_active(_id=_id)
-        if event:
-            return {'event': event.json()}
-        abort(404, message=EVENT_DOES_NOT_EXIST)
+        def build():
+            args = view_parser.parse_args()
+            event = EventModel.find_without_active(_id=_id)
+            if event:
+                return event_response(event, args.view, envelope=True)
+            abort(404, message=EVENT_DOES_NOT_EXIST)
+        return response_cache.cached('events', build)
@@ -0,0 +1,26 @@
+from flask import Response, current_app, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_restful import Resource, abort
+from werkzeug.security import safe_str_cmp
+from resources.admin import admin_required
+from utils.metrics import registry
+
+
+class Metrics(Resource):
+    """
+    /metrics - Metrics of the worker in the Prometheus text format, for the scrapers
+    sending `Authorization: Bearer <METRICS_TOKEN>` or for the admins.
+    """
+    @classmethod
+    def get(cls):
+        token = current_app.config['METRICS_TOKEN']
+        if not (token and safe_str_cmp(request.headers.get('Authorization', ''), f"Bearer {token}")):
+            verify_jwt_in_request(optional=True)
+            if get_jwt_identity() is None:
+                abort(401, message="Admin privilege required.")
+            return admin_required(cls.render)()
+        return cls.render()
+
+    @classmethod
+    def render(cls):
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -1,23 +1,30 @@
 from datetime import datetime
 import functools
-from utils import UPLOAD_FOLDER, remove_file_upload, saveFileUploaded
+from utils import saveFileUploaded
 from flask_jwt_extended import (
     jwt_required, create_access_token,
     create_refresh_token, get_jwt_identity
 )
 from werkzeug.security import check_password_hash, generate_password_hash, safe_str_cmp
+from flask import request
 from flask_restful import Resource, abort
 
 from models.organizer import OrganizerModel
-from parsers.organizer import post_parser, put_parser, reset_parser, login_parser
+from models.image_job import ImageJobModel
+from models.claims import invalidate_claims
+from parsers.organizer import (
+    post_parser, put_parser, reset_parser, login_parser, list_parser, depth_parser)
 from parsers.event import active_parser
+from utils.http import conditional, make_etag
+from utils.pagination import InvalidCursor, keyset_page
+from utils.streaming import STREAM_BATCH_SIZE, stream_mimetype, stream_response
 from .admin import admin_required
 
 # Message
 from resources import (
     ACCOUNT_DOES_NOT_EXIST, ACCOUNT_ALREADY_EXISTS, ACCOUNT_SUCCESSFULLY_CREATED,
     ACCOUNT_SUCCESSFULLY_DELETED, ACCOUNT_SUCCESSFULLY_UPDATED, EXTENTION_ERROR,
-    INVALIDCREDENTIALS, SERVER_ERROR)
+    INVALID_CURSOR, INVALIDCREDENTIALS, SERVER_ERROR)
 
 
 def organizer_required(func):
@@ -39,13 +46,16 @@ class OrganizerRegister(Resource):
         if OrganizerModel.find_by_email(email=data.email):
             abort(400, message=ACCOUNT_ALREADY_EXISTS.format(data.email))
         organizer = OrganizerModel(**data)
+        organizer.photo = None
         if data['photo']:
-            response = saveFileUploaded(data['photo'], 'organizer')
-            if response is None:
+            filename = saveFileUploaded(data['photo'], 'organizer')
+            if filename is None:
                 abort(400, message=EXTENTION_ERROR)
-            organizer.photo = response
+        job = None
         try:
             organizer.save()
+            if data['photo']:
+                job = ImageJobModel.enqueue('organizer', filename, organizer)
             access_token = create_access_token(identity=organizer._uuid, fresh=True)
             refresh_token = create_refresh_token(identity=organizer._uuid)
 
@@ -55,6 +65,8 @@ class OrganizerRegister(Resource):
                 'message': ACCOUNT_SUCCESSFULLY_CREATED
             }, 201
         except Exception as e:
+            if data['photo'] and job is None:
+                ImageJobModel.abandon('organizer', filename)
             abort(500, message=SERVER_ERROR.format(type(e).__name__))
 
 
@@ -63,10 +75,16 @@ class Organizer(Resource):
     @jwt_required()
     def get(cls, _id: int):
         """ /organizer/<id> - Get a organizer."""
-        organizer = OrganizerModel.find_by_id(_id=_id)
-        if not organizer:
+        args = depth_parser.parse_args()
+        fingerprint = OrganizerModel.validators(
+            OrganizerModel.id_query(_id), depth=args.depth)
+        if not fingerprint:
             abort(404, message=ACCOUNT_DOES_NOT_EXIST)
-        return organizer.json()
+
+        def build():
+            organizer = OrganizerModel.find_with_events(_id=_id, depth=args.depth)
+            return organizer.json(depth=args.depth)
+        return conditional(build, make_etag(request.full_path, fingerprint))
 
     @classmethod
     @jwt_required()
@@ -75,23 +93,25 @@ class Organizer(Resource):
         """ /organizer/<id> - Update a organizer."""
         organizer_found = OrganizerModel.find_by_id(_id=_id)
         if organizer_found:
-            existing_photo = organizer_found.photo
             data = put_parser.parse_args(strict=True)
             organizer_found.name = data.name
             organizer_found.email = data.email
             organizer_found.contacts = data.contacts
             if data['photo']:
-                response = saveFileUploaded(data['photo'], 'organizer')
-                if response is None:
+                filename = saveFileUploaded(data['photo'], 'organizer')
+                if filename is None:
                     abort(400, message=EXTENTION_ERROR)
-                organizer_found.photo = response
-                remove_file_upload(f"{UPLOAD_FOLDER}/organizer/{existing_photo}")
             organizer_found.updated_at = datetime.utcnow()
 
+            job = None
             try:
                 organizer_found.save()
+                if data['photo']:
+                    job = ImageJobModel.enqueue('organizer', filename, organizer_found)
                 return {'message': ACCOUNT_SUCCESSFULLY_UPDATED}
             except Exception as e:
+                if data['photo'] and job is None:
+                    ImageJobModel.abandon('organizer', filename)
                 abort(500, message=SERVER_ERROR.format(type(e).__name__))
         abort(400, message=ACCOUNT_DOES_NOT_EXIST)
 
@@ -104,6 +124,7 @@ class Organizer(Resource):
         if organizer:
             try:
                 organizer.delete()
+                invalidate_claims(organizer._uuid)
                 return {'message': ACCOUNT_SUCCESSFULLY_DELETED}
             except Exception as e:
                 abort(500, message=SERVER_ERROR.format(type(e).__name__))
@@ -116,7 +137,28 @@ class OrganizerList(Resource):
     @jwt_required()
     @admin_required
     def get(cls):
-        return {'organizers': [organizer.json() for organizer in OrganizerModel.find_all()]}
+        args = list_parser.parse_args()
+        mimetype = stream_mimetype(args.stream)
+        if mimetype:
+            organizers = OrganizerModel.export_query(STREAM_BATCH_SIZE, depth=args.depth)
+            return stream_response(
+                'organizers',
+                (organizer.json(depth=args.depth) for organizer in organizers),
+                mimetype)
+        try:
+            page, columns = OrganizerModel.page_query(cursor=args.cursor, limit=args.limit)
+        except InvalidCursor:
+            abort(400, message=INVALID_CURSOR)
+        fingerprint = OrganizerModel.validators(page, depth=args.depth)
+
+        def build():
+            organizers, next_cursor = keyset_page(
+                OrganizerModel.with_depth(page, args.depth).all(), columns, args.limit)
+            return {
+                'organizers': [organizer.json(depth=args.depth) for organizer in organizers],
+                'next_cursor': next_cursor
+            }
+        return conditional(build, make_etag(request.full_path, fingerprint))
 
 
 class OrganizerPasswordReset(Resource):
@@ -168,6 +210,7 @@ class OrganizerActivation(Resource):
             organizer.updated_at = datetime.utcnow()
             try:
                 organizer.save()
+                invalidate_claims(organizer._uuid)
                 return {'message': ACCOUNT_SUCCESSFULLY_UPDATED}
             except Exception as e:
                 abort(500, message=SERVER_ERROR.format(type(e).__name__))
@@ -1,11 +1,163 @@
-from flask_restful import Resource
-from flask import send_from_directory
-from utils import UPLOAD_FOLDER
-from flask_jwt_extended import jwt_required
+from datetime import datetime
+import mimetypes
+import posixpath
+import time
+
+from flask_restful import Resource, abort
+from flask import current_app, request, send_file, url_for
+from itsdangerous import Signer
+from parsers.upload import upload_parser
+from resources import INVALID_UPLOAD_SIGNATURE, SIGNED_URLS_DISABLED, UPLOAD_DOES_NOT_EXIST
+from utils import CHUNK_SIZE, HASHED_NAME, format_datetime, upload_key
+from utils.http import is_not_modified
+from utils.images import ORIGINAL, variant_name
+from utils.storage import storage
+from flask_jwt_extended import jwt_required, verify_jwt_in_request
+from werkzeug.datastructures import ContentRange
+from werkzeug.exceptions import NotFound, RequestedRangeNotSatisfiable
+from werkzeug.wsgi import wrap_file
+
+
+def _signer() -> Signer:
+    return Signer(current_app.secret_key, salt='upload')
+
+
+def _signed_value(filename: str, folder: str, expires: int) -> bytes:
+    return f"{folder}/{filename}/{expires}".encode()
+
+
+def sign_upload(filename: str, folder: str) -> tuple:
+    """
+    Expiry and signature of a link to an upload, valid between UPLOAD_URL_TTL and twice
+    as long. The expiry is rounded so that the link, and the image cached under it,
+    stays the same for UPLOAD_URL_TTL seconds.
+    """
+    ttl = current_app.config['UPLOAD_URL_TTL']
+    expires = (int(time.time()) // ttl + 2) * ttl
+    signature = _signer().get_signature(_signed_value(filename, folder, expires)).decode()
+    return expires, signature
+
+
+def _byte_range(stored):
+    """
+    (start, stop) of the byte range asked for, None for the whole file: no Range header,
+    several ranges, or an If-Range the file no longer matches. 416 past its end.
+    """
+    byte_range = request.range
+    if byte_range is None or byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        return None
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != stored.etag:
+        return None
+    if if_range.date is not None and (
+            if_range.date.replace(tzinfo=None) != stored.modified.replace(microsecond=0)):
+        return None
+    found = byte_range.range_for_length(stored.size)
+    if found is None:
+        raise RequestedRangeNotSatisfiable(length=stored.size)
+    return found
+
+
+def send_upload(key: str, immutable: bool, max_age: int, public: bool, stored=None):
+    """
+    Send a stored upload, or hand it over to the front server when UPLOAD_SENDFILE is
+    set, which then deals with the Range requests. Content addressed files never change:
+    they are cached for `max_age` seconds without revalidation, the others are
+    revalidated with their ETag. `stored` is the StoredFile of the key when the caller
+    already has it.
+    """
+    stored = stored or storage.stat(key)
+    if stored is None:
+        raise NotFound()
+    path = storage.local_path(key)
+    mimetype = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+    if path is None:
+        # Remote storage: streamed through, only the bytes asked for are fetched.
+        if is_not_modified(stored.etag, stored.modified):
+            response = current_app.response_class(status=304)
+        else:
+            byte_range = _byte_range(stored)
+            response = current_app.response_class(
+                wrap_file(request.environ, storage.open(key, byte_range), CHUNK_SIZE),
+                mimetype=mimetype, direct_passthrough=True)
+            if byte_range is None:
+                response.content_length = stored.size
+            else:
+                start, stop = byte_range
+                response.status_code = 206
+                response.content_length = stop - start
+                response.content_range = ContentRange('bytes', start, stop, stored.size)
+            response.accept_ranges = 'bytes'
+            response.last_modified = stored.modified
+        response.set_etag(stored.etag)
+    elif current_app.config['UPLOAD_SENDFILE'] == 'x-accel-redirect':
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = current_app.config['UPLOAD_ACCEL_PREFIX'] + key
+    else:
+        # X-Sendfile, when USE_X_SENDFILE is set, or the file with ETag, 304 and 206 answers.
+        response = send_file(path, mimetype=mimetype, conditional=True)
+
+    cache_control = response.cache_control
+    cache_control.public = public
+    if not public:
+        cache_control.private = True
+    if immutable:
+        cache_control.max_age = max_age
+        cache_control.immutable = True
+    else:
+        cache_control.max_age = None
+        cache_control.no_cache = True
+    return response
 
 
 class Upload(Resource):
     @classmethod
-    @jwt_required()
     def get(cls, filename: str, folder: str):  # client, event, organizer
-        return send_from_directory(f"{UPLOAD_FOLDER}/{folder}", filename)
+        """
+        The uploaded image, or with `size` one of its variants, in WebP when the client
+        accepts it unless `format` says otherwise. Uploads older than the variants are
+        served as they are. Needs a token, or the `expires` and `signature` of a link
+        given by UploadUrl, which browsers can use in an <img> and cache.
+        """
+        args = upload_parser.parse_args()
+        max_age = current_app.config['UPLOAD_MAX_AGE']
+        if args.signature:
+            if args.expires is None or args.expires < time.time() or not _signer().verify_signature(
+                    _signed_value(filename, folder, args.expires), args.signature):
+                abort(403, message=INVALID_UPLOAD_SIGNATURE)
+            max_age = min(max_age, args.expires - int(time.time()))
+        else:
+            verify_jwt_in_request()
+
+        immutable = bool(HASHED_NAME.match(filename))
+        key = upload_key(filename, folder)
+        stored = None
+        if args.size != ORIGINAL:
+            extension = args.format or (
+                'webp' if request.accept_mimetypes['image/webp'] else 'jpeg')
+            variant = posixpath.join(
+                posixpath.dirname(key), variant_name(filename, args.size, extension))
+            stored = storage.stat(variant)
+            if stored is not None:
+                key = variant
+        response = send_upload(key, immutable, max_age, public=bool(args.signature), stored=stored)
+        response.vary.add('Accept')
+        return response
+
+
+class UploadUrl(Resource):
+    @classmethod
+    @jwt_required()
+    def get(cls, filename: str, folder: str):
+        """ /upload/<filename>/<folder>/url - Signed link to an upload, valid for UPLOAD_URL_TTL. """
+        if not current_app.config['UPLOAD_URL_TTL']:
+            abort(400, message=SIGNED_URLS_DISABLED)
+        if not storage.exists(upload_key(filename, folder)):
+            abort(400, message=UPLOAD_DOES_NOT_EXIST)
+        expires, signature = sign_upload(filename, folder)
+        return {
+            'url': url_for(
+                'upload', filename=filename, folder=folder, expires=expires,
+                signature=signature, _external=True),
+            'expires_at': format_datetime(datetime.utcfromtimestamp(expires))
+        }
@@ -6,20 +6,25 @@ from flask_jwt_extended import (
 )
 
 from models.user import UserModel
+from models.claims import invalidate_claims
 from models.event import EventModel
 from models.token import TokenBlockList
-from parsers.user import post_parser, put_parser, reset_parser, login_parser
+from models.image_job import ImageJobModel
+from parsers import MAX_BATCH_SIZE
+from parsers.user import (
+    post_parser, put_parser, reset_parser, login_parser, list_parser, favourites_parser)
 from parsers.event import active_parser
 from werkzeug.security import check_password_hash, safe_str_cmp, generate_password_hash
 from datetime import datetime
 from .admin import admin_required
-from utils import remove_file_upload, saveFileUploaded, UPLOAD_FOLDER
+from utils import saveFileUploaded
+from utils.streaming import STREAM_BATCH_SIZE, stream_mimetype, stream_response
 
 # Message
 from resources import (
     ACCOUNT_DOES_NOT_EXIST, ACCOUNT_ALREADY_EXISTS, ACCOUNT_SUCCESSFULLY_CREATED,
     ACCOUNT_SUCCESSFULLY_DELETED, ACCOUNT_SUCCESSFULLY_UPDATED, EVENT_DOES_NOT_EXIST,
-    EXTENTION_ERROR, INVALIDCREDENTIALS, SERVER_ERROR)
+    BATCH_TOO_LARGE, EXTENTION_ERROR, INVALIDCREDENTIALS, SERVER_ERROR)
 
 
 def client_required(func):
@@ -41,15 +46,17 @@ class UserRegister(Resource):
         if UserModel.find_by_email(email=data.email):
             abort(400, message=ACCOUNT_ALREADY_EXISTS)
         user = UserModel(**data)
+        user.photo = None
         if data['photo']:
-            response = saveFileUploaded(data['photo'], 'client')
-            print(response)
-            if response is None:
+            filename = saveFileUploaded(data['photo'], 'client')
+            if filename is None:
                 abort(400, message=EXTENTION_ERROR)
-            user.photo = response
 
+        job = None
         try:
             user.save()
+            if data['photo']:
+                job = ImageJobModel.enqueue('client', filename, user)
             access_token = create_access_token(identity=user._uuid, fresh=True)
             refresh_token = create_refresh_token(identity=user._uuid)
 
@@ -58,8 +65,30 @@ class UserRegister(Resource):
                 'token': {'access_token': access_token, 'refresh_token': refresh_token},
                 'message': ACCOUNT_SUCCESSFULLY_CREATED
             }, 201
+        except Exception as e:
+            if data['photo'] and job is None:
+                ImageJobModel.abandon('client', filename)
+            abort(500, message=SERVER_ERROR.format(type(e).__name__))
+
+
+class UserFavouriteEvents(Resource):
+    """ /user/favourite-events - Add a batch of events to the users favourites"""
+    @classmethod
+    @jwt_required()
+    @client_required
+    def post(cls):
+        data = favourites_parser.parse_args(strict=True)
+        pairs = data.favourites
+        if len(pairs) > MAX_BATCH_SIZE:
+            abort(400, message=BATCH_TOO_LARGE.format(MAX_BATCH_SIZE))
+        try:
+            statuses = UserModel.add_favourites(pairs)
         except Exception as e:
             abort(500, message=SERVER_ERROR.format(type(e).__name__))
+        return {'favourites': [
+            {'user_id': user_id, 'event_id': event_id, 'status': status}
+            for (user_id, event_id), status in zip(pairs, statuses)
+        ]}
 
 
 class UserFavouriteEvent(Resource):
@@ -114,23 +143,25 @@ class User(Resource):
         """ /user/<id> - Update a user."""
         user_found = UserModel.find_by_id(_id=_id)
         if user_found:
-            existing_photo = user_found.photo
             data = put_parser.parse_args(strict=True)
             user_found.firstname = data.firstname
             user_found.lastname = data.lastname
             user_found.email = data.email
             user_found.contacts = data.contacts
             if data['photo']:
-                response = saveFileUploaded(data['photo'], 'client')
-                if response is None:
+                filename = saveFileUploaded(data['photo'], 'client')
+                if filename is None:
                     abort(400, message=EXTENTION_ERROR)
-                user_found.photo = response
-                remove_file_upload(f"{UPLOAD_FOLDER}/client/{existing_photo}")
             user_found.updated_at = datetime.utcnow()
+            job = None
             try:
                 user_found.save()
+                if data['photo']:
+                    job = ImageJobModel.enqueue('client', filename, user_found)
                 return {'message': ACCOUNT_SUCCESSFULLY_UPDATED}
             except Exception as e:
+                if data['photo'] and job is None:
+                    ImageJobModel.abandon('client', filename)
                 abort(500, message=SERVER_ERROR.format(type(e).__name__))
         abort(400, message=ACCOUNT_DOES_NOT_EXIST)
 
@@ -144,6 +175,7 @@ class User(Resource):
             try:
                 user.deleted = True
                 user.save()
+                invalidate_claims(user._uuid)
                 return {'message': ACCOUNT_SUCCESSFULLY_DELETED}
             except Exception as e:
                 abort(500, message=SERVER_ERROR.format(type(e).__name__))
@@ -155,6 +187,11 @@ class UserList(Resource):
     @ classmethod
     # @jwt_required()  # admin claims
     def get(cls):
+        args = list_parser.parse_args()
+        mimetype = stream_mimetype(args.stream)
+        if mimetype:
+            users = UserModel.export_query(STREAM_BATCH_SIZE)
+            return stream_response('users', (user.json() for user in users), mimetype)
         return {'users': [user.json() for user in UserModel.find_all()]}
 
 
@@ -198,8 +235,8 @@ class Logout(Resource):
     @classmethod
     @jwt_required()
     def delete(cls):
-        jti = get_jwt()['jti']
-        current_token = TokenBlockList(jti=jti)
+        decoded_token = get_jwt()
+        current_token = TokenBlockList(jti=decoded_token['jti'], exp=decoded_token['exp'])
         current_token.save()
 
         return {"message": "JWT révoqué et déconnexion de l'utilisateur réussie !"}
@@ -228,6 +265,7 @@ class UserActivation(Resource):
             user.updated_at = datetime.utcnow()
             try:
                 user.save()
+                invalidate_claims(user._uuid)
                 return {'message': ACCOUNT_SUCCESSFULLY_UPDATED}
             except Exception as e:
                 abort(500, message=SERVER_ERROR.format(type(e).__name__))
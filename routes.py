@@ -1,6 +1,6 @@
 from resources.user import (
     User, UserRegister, UserList, UserPasswordReset,
-    UserLogin, Logout, TokenRefresh, UserFavouriteEvent, UserActivation
+    UserLogin, Logout, TokenRefresh, UserFavouriteEvent, UserFavouriteEvents, UserActivation
 )
 
 from resources.organizer import (
@@ -10,7 +10,8 @@ from resources.organizer import (
 
 from resources.event import (
     Event, EventStore, EventPublishedList, EventUnpublishedList, EventPublication,
-    EventParticipant, EventAuthorization, EventUnauthorizedList, AllEvent
+    EventParticipant, EventAuthorization, EventUnauthorizedList, AllEvent, EventWaitlist,
+    EventSearch, EventParticipants
 )
 
 from resources.admin import (
@@ -18,7 +19,8 @@ from resources.admin import (
     AdminPasswordReset, AdminRole
 )
 
-from resources.upload import Upload
+from resources.upload import Upload, UploadUrl
+from resources.metrics import Metrics
 
 ROUTES = [
     # User
@@ -31,6 +33,7 @@ ROUTES = [
         'resource': UserFavouriteEvent,
         'endpoint': '/user/favourite-event/<int:user_id>/<int:event_id>'
     },
+    {'resource': UserFavouriteEvents, 'endpoint': '/user/favourite-events'},
 
     # Organizer
     {'resource': Organizer, 'endpoint': '/organizer/<int:_id>'},
@@ -46,6 +49,7 @@ ROUTES = [
     {'resource': EventStore, 'endpoint': '/event/store'},
     {'resource': Event, 'endpoint': '/event/<int:_id>'},
     {'resource': EventPublishedList, 'endpoint': '/events'},
+    {'resource': EventSearch, 'endpoint': '/events/search'},
     {'resource': EventPublication, 'endpoint': '/event/publication/<int:_id>'},
     {'resource': EventUnpublishedList, 'endpoint': '/events/unpublished'},
     {'resource': EventAuthorization, 'endpoint': '/event/authorization/<int:_id>'},
@@ -55,6 +59,11 @@ ROUTES = [
         'resource': EventParticipant,
         'endpoint': '/event/participant/<int:event_id>/<int:user_id>'
     },
+    {'resource': EventParticipants, 'endpoint': '/event/participants'},
+    {
+        'resource': EventWaitlist,
+        'endpoint': '/event/waitlist/<int:event_id>/<int:user_id>'
+    },
 
     # Admin
     {'resource': Admin, 'endpoint': '/admin/<int:_id>'},
@@ -70,4 +79,6 @@ ROUTES = [
     {'resource': Logout, 'endpoint': '/logout'},
     {'resource': TokenRefresh, 'endpoint': '/token/refresh'},
     {'resource': Upload, 'endpoint': '/upload/<string:filename>/<string:folder>'},
+    {'resource': UploadUrl, 'endpoint': '/upload/<string:filename>/<string:folder>/url'},
+    {'resource': Metrics, 'endpoint': '/metrics'},
 ]
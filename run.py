@@ -1,6 +1,21 @@
 from app import app
 from db import db
 from ma import ma
+from cache import cache, response_cache
+from utils.storage import storage
+from models.token import TokenBlockList
+from utils.sweeper import start_sweeper
 
 db.init_app(app)
 ma.init_app(app)
+cache.init_app(app)
+response_cache.init_app(app)
+storage.init_app(app)
+
+if app.config['TOKEN_SWEEP_INTERVAL']:
+    start_sweeper(
+        app,
+        lambda: TokenBlockList.purge_expired(app.config['TOKEN_SWEEP_BATCH_SIZE']),
+        app.config['TOKEN_SWEEP_INTERVAL'],
+        name='token-sweeper'
+    )
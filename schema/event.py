@@ -21,3 +21,7 @@ class EventSchema(ma.Schema):
         )
 
     #participants = ma.Nested('UserSchema', many=True)
+
+
+event_schema = EventSchema()
+events_schema = EventSchema(many=True)
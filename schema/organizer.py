@@ -16,3 +16,7 @@ class OrganizerSchema(ma.Schema):
         )
 
         #events = ma.Nested(EventSchema, many=True)
+
+
+organizer_schema = OrganizerSchema()
+organizers_schema = OrganizerSchema(many=True)
@@ -17,3 +17,7 @@ class UserSchema(ma.Schema):
             'deleted'
         )
     #favourite_events = ma.Nested(EventSchema, many=True)
+
+
+user_schema = UserSchema()
+users_schema = UserSchema(many=True)
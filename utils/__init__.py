@@ -1,10 +1,17 @@
 from uuid import uuid4
-import json
-from datetime import datetime
+from datetime import datetime, timezone
+import hashlib
 import os
+import posixpath
+import re
+
+from utils.images import INVALID_IMAGE_ERRORS, check_image, variant_names
+from utils.storage import storage
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
-UPLOAD_FOLDER = f"{os.getcwd()}/uploads"
+# Uploads are named after the SHA-256 of their content, e.g. 9f86d081...0f00a08.png.
+HASHED_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z]+$')
+CHUNK_SIZE = 64 * 1024
 
 
 def allowed_file(filename):
@@ -12,13 +19,17 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def json_serializer(datetime_object):
-    if isinstance(datetime_object, datetime):
-        return datetime_object.__str__()
+def format_datetime(value):
+    """Formats a date time in ISO 8601, None staying None."""
+    return None if value is None else value.isoformat()
 
 
-def json_dump_(datetime_object):
-    return json.dumps(datetime_object, default=json_serializer).replace('"', '')
+def parse_datetime(value: str) -> datetime:
+    """Parses an ISO 8601 date or date time into a naive UTC datetime."""
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
 
 
 def generate_uuid() -> str:
@@ -26,15 +37,66 @@ def generate_uuid() -> str:
     return str(uuid4())[:8]
 
 
+def upload_key(filename: str, subFolder: str) -> str:
+    """
+    Storage key of an upload. Content addressed uploads are sharded by the first two
+    bytes of their hash, event/9f/86/9f86d081...png, older ones are in the folder.
+    """
+    if HASHED_NAME.match(filename):
+        return f"{subFolder}/{filename[:2]}/{filename[2:4]}/{filename}"
+    return f"{subFolder}/{filename}"
+
+
+def variant_keys(key: str) -> list:
+    """ Storage keys of the variants of an upload, stored next to it. """
+    folder, filename = posixpath.split(key)
+    return [posixpath.join(folder, name) for name in variant_names(filename)]
+
+
 def saveFileUploaded(fileStorage, subFolder: str):
-    """Persists an uploaded file in the uploads folder and generates a custom file name."""
-    filename = f"{generate_uuid()}{os.path.splitext(fileStorage.filename)[1]}"
-    if allowed_file(fileStorage.filename):
-        fileStorage.save(os.path.join(f"{UPLOAD_FOLDER}/{subFolder}", filename))
+    """
+    Persists an uploaded image in the uploads storage under the SHA-256 of its content,
+    hashed while it is written, so that an image uploaded again is stored once. Returns
+    None when the file is not an image. Its variants are made by `manage.py image_worker`.
+    """
+    from models.upload_ref import UploadRefModel
+
+    if not allowed_file(fileStorage.filename):
+        return None
+    digest = hashlib.sha256()
+    descriptor, temporary = storage.temporary_file()
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            for chunk in iter(lambda: fileStorage.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                file.write(chunk)
+        try:
+            check_image(temporary)
+        except INVALID_IMAGE_ERRORS:
+            return None
+        extension = fileStorage.filename.rsplit('.', 1)[1].lower()
+        filename = f"{digest.hexdigest()}.{extension}"
+        key = upload_key(filename, subFolder)
+
+        def place() -> bool:
+            if storage.exists(key):
+                return True
+            storage.put_file(key, temporary)
+            return False
+
+        UploadRefModel.acquire(subFolder, filename, place)
         return filename
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
 
+def remove_file_upload(filename: str, subFolder: str) -> bool:
+    """
+    Drop a reference to an upload, deleting it and its variants when nothing else
+    uses it. Returns True when it was deleted.
+    """
+    from models.upload_ref import UploadRefModel
 
-def remove_file_upload(file_path) -> None:
-    """Delete the existing files in the uploads folder."""
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    key = upload_key(filename, subFolder)
+    return UploadRefModel.release(subFolder, filename, lambda: storage.delete([key] + variant_keys(key)))
@@ -0,0 +1,265 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request
+from werkzeug.http import parse_date, unquote_etag
+
+from utils.http import is_not_modified
+from utils.metrics import registry
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_RESPONSE_TTL = 60
+
+
+class MemoryBackend:
+    """ Bounded LRU store with a per-entry expiry, local to the worker process. """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key) -> int:
+        with self._lock:
+            value, expires_at = self._entries.get(key, (0, None))
+            self._entries[key] = (value + 1, expires_at)
+            self._entries.move_to_end(key)
+            return value + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """
+    Store shared by every worker, backed by Redis or any server speaking its protocol.
+
+    Needs the `redis` package, which is only imported when this backend is selected.
+    """
+
+    def __init__(self, url, prefix='eventhub:'):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        px = max(int(ttl * 1000), 1) if ttl else None
+        self._client.set(self.prefix + key, json.dumps(value), px=px)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def incr(self, key) -> int:
+        return self._client.incr(self.prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(match=f"{self.prefix}*"):
+            self._client.delete(key)
+
+
+class SqliteBackend:
+    """
+    Store shared by the workers of one host through a SQLite file, for a single
+    server or development without Redis. Expired entries are deleted on writes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_expires_at ON cache (expires_at)")
+
+    def _connection(self):
+        # One connection per thread, and a new one in forked workers.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level='IMMEDIATE')
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None))
+
+    def delete(self, key):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key) -> int:
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO cache (key, value) VALUES (?, '1') ON CONFLICT (key) DO UPDATE "
+                "SET value = CAST(CAST(value AS INTEGER) + 1 AS TEXT)", (key,))
+            return int(connection.execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)).fetchone()[0])
+
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM cache")
+
+
+def make_backend(url=None, max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    Build the backend matching a CACHE_URL: memory:// (default), redis:// or
+    sqlite:///path/to/cache.db.
+    """
+    if not url or url.startswith('memory://'):
+        return MemoryBackend(max_entries=max_entries)
+    if url.split('://', 1)[0] in ('redis', 'rediss', 'unix'):
+        return RedisBackend(url)
+    if url.startswith('sqlite:///'):
+        return SqliteBackend(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported cache url: {url}")
+
+
+class Cache:
+    """ Application cache, configured from CACHE_URL and CACHE_MAX_ENTRIES. """
+
+    def __init__(self, app=None):
+        self.backend = MemoryBackend()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backend = make_backend(
+            app.config.get('CACHE_URL'),
+            app.config.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        )
+        app.extensions['cache'] = self
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def incr(self, key) -> int:
+        return self.backend.incr(key)
+
+    def clear(self):
+        self.backend.clear()
+
+
+class ResponseCache:
+    """
+    Whole JSON responses of public reads, kept in the application cache under their
+    endpoint and query string, configured from RESPONSE_CACHE_TTL (0 disables it).
+
+    Each namespace has a generation counter that is part of the keys: `invalidate`
+    bumps it, which drops every cached response of the namespace at once, on every
+    worker sharing the backend. The counter lives in the cache too and may be evicted,
+    a missing one starts again from the time.
+    """
+
+    def __init__(self, cache, app=None):
+        self.cache = cache
+        self.ttl = DEFAULT_RESPONSE_TTL
+        self.hits = registry.counter(
+            'response_cache_hits_total', 'Responses served from the response cache.')
+        self.misses = registry.counter(
+            'response_cache_misses_total', 'Responses built because they were not cached.')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', DEFAULT_RESPONSE_TTL)
+
+    def generation(self, namespace) -> int:
+        key = f"response:{namespace}:generation"
+        generation = self.cache.get(key)
+        if generation is None:
+            # Never set, or evicted: start from the clock, in microseconds, past every
+            # generation used before, so that older responses still cached stay dead.
+            generation = time.time_ns() // 1000
+            self.cache.set(key, generation)
+        return generation
+
+    def invalidate(self, namespace) -> int:
+        """ Drop the cached responses of `namespace`, returns its new generation. """
+        self.generation(namespace)
+        return self.cache.incr(f"response:{namespace}:generation")
+
+    def key(self, namespace) -> str:
+        args = '&'.join(f"{name}={value}" for name, value in sorted(request.args.items(multi=True)))
+        return f"response:{namespace}:{self.generation(namespace)}:{request.path}?{args}"
+
+    def cached(self, namespace, build):
+        """
+        Response of the current request from the cache, otherwise from `build`,
+        a view returning a body or a (body, status, headers) tuple. Only 200s are
+        stored, with their headers, so cached responses still answer conditional
+        requests with a 304.
+        """
+        if not self.ttl:
+            return build()
+        key = self.key(namespace)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.hits.inc(namespace=namespace)
+            body, headers = entry
+            etag = headers.get('ETag')
+            last_modified = parse_date(headers.get('Last-Modified'))
+            if last_modified is not None:
+                last_modified = last_modified.replace(tzinfo=None)
+            if etag and is_not_modified(unquote_etag(etag)[0], last_modified):
+                return '', 304, headers
+            return body, 200, headers
+
+        self.misses.inc(namespace=namespace)
+        response = build()
+        body, status, headers = response if isinstance(response, tuple) else (response, 200, {})
+        if status == 200:
+            self.cache.set(key, [body, headers], self.ttl)
+        return response
@@ -0,0 +1,49 @@
+""" JSON encoding of the API responses, with native dates and orjson when installed. """
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app, make_response
+from flask.json import JSONEncoder as FlaskJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library encoder is used without it
+    orjson = None
+
+
+class JSONEncoder(FlaskJSONEncoder):
+    """ Encodes dates in ISO 8601, like `utils.format_datetime`, instead of HTTP dates. """
+
+    def default(self, o):
+        if isinstance(o, (datetime, date)):
+            return o.isoformat()
+        if isinstance(o, Decimal):
+            return float(o)
+        return super().default(o)
+
+
+_default = JSONEncoder().default
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(data, cls=JSONEncoder) + "\n").encode()
+
+
+def output_json(data, code, headers=None):
+    """
+    Flask-RESTful representation of application/json. RESTFUL_JSON settings, and
+    the indented output of debug mode, go through the standard library encoder.
+    """
+    settings = current_app.config.get('RESTFUL_JSON', {})
+    if settings or current_app.debug:
+        settings = {'indent': 4, **settings}
+        dumped = json.dumps(data, cls=JSONEncoder, **settings) + "\n"
+    else:
+        dumped = dumps(data)
+
+    response = make_response(dumped, code)
+    response.headers.extend(headers or {})
+    return response
@@ -0,0 +1,41 @@
+import hashlib
+
+from flask import request
+from werkzeug.http import http_date, quote_etag
+
+
+def make_etag(*parts) -> str:
+    """ Strong validator of a representation built from its fingerprint parts. """
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def validator_headers(etag: str, last_modified=None) -> dict:
+    """ ETag and Last-Modified headers; clients revalidate before every reuse. """
+    headers = {'ETag': quote_etag(etag), 'Cache-Control': 'no-cache'}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def is_not_modified(etag: str, last_modified=None) -> bool:
+    """
+    Tell if the client copy is still fresh. If-None-Match takes precedence over
+    If-Modified-Since, as in RFC 7232.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified is not None:
+        since = request.if_modified_since.replace(tzinfo=None)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def conditional(build, etag: str, last_modified=None):
+    """
+    Answer 304 when the client copy is fresh, otherwise call `build` for the body.
+    Either way the response carries the validators.
+    """
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(etag, last_modified):
+        return '', 304, headers
+    return build(), 200, headers
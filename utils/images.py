@@ -0,0 +1,62 @@
+""" Resized and recompressed variants of the uploaded images. """
+import os
+
+from PIL import Image, ImageOps
+
+ORIGINAL = 'original'
+# Variant name -> width in pixels, never upscaled.
+VARIANT_WIDTHS = {'thumb': 160, 'small': 480, 'medium': 1024}
+# Extension -> Pillow format and encoder options.
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+
+# Raised for uploads that are not images, or whose pixel count is a decompression bomb.
+INVALID_IMAGE_ERRORS = (OSError, Image.DecompressionBombError)
+
+
+def variant_name(filename: str, size: str, extension: str) -> str:
+    """ File name of a variant: poster.png -> poster_thumb.webp. """
+    return f"{os.path.splitext(filename)[0]}_{size}.{extension}"
+
+
+def variant_names(filename: str) -> list:
+    return [
+        variant_name(filename, size, extension)
+        for size in VARIANT_WIDTHS for extension in VARIANT_FORMATS
+    ]
+
+
+def check_image(path: str) -> None:
+    """
+    Read the header of the image at `path`, without decoding it. Raises one of
+    INVALID_IMAGE_ERRORS when the file is not an image.
+    """
+    with Image.open(path):
+        pass
+
+
+def make_variants(path: str) -> list:
+    """
+    Write every variant of the image at `path` next to it and return their paths.
+    Raises one of INVALID_IMAGE_ERRORS when the file is not a readable image.
+    """
+    folder, filename = os.path.split(path)
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        written = []
+        for size, width in VARIANT_WIDTHS.items():
+            resized = image
+            if image.width > width:
+                height = round(image.height * width / image.width)
+                resized = image.resize((width, height), Image.LANCZOS)
+            for extension, (image_format, options) in VARIANT_FORMATS.items():
+                variant = os.path.join(folder, variant_name(filename, size, extension))
+                resized.save(variant, image_format, **options)
+                written.append(variant)
+    return written
@@ -0,0 +1,74 @@
+""" Per route metrics of the requests: latency, status, in-flight and database work. """
+import time
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utils.metrics import registry
+
+STARTED = 'eventhub.started'
+STATUS = 'eventhub.status'
+QUERIES = 'eventhub.db_queries'
+DB_SECONDS = 'eventhub.db_seconds'
+
+request_seconds = registry.histogram(
+    'http_request_duration_seconds', 'Time spent answering the requests, per route.')
+requests_total = registry.counter('http_requests_total', 'Requests answered, per route and status.')
+in_flight = registry.gauge('http_requests_in_flight', 'Requests being answered.')
+request_queries = registry.histogram(
+    'http_request_db_queries', 'Database queries run per request, per route.',
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+request_db_seconds = registry.histogram(
+    'http_request_db_seconds', 'Time spent in the database per request, per route.')
+
+
+def _before_request():
+    request.environ[STARTED] = time.perf_counter()
+    request.environ[QUERIES] = 0
+    request.environ[DB_SECONDS] = 0.0
+    in_flight.inc()
+
+
+def _after_request(response):
+    request.environ[STATUS] = response.status_code
+    return response
+
+
+def _teardown_request(exception=None):
+    environ = request.environ
+    started = environ.get(STARTED)
+    if started is None:
+        return
+    in_flight.dec()
+    # The route template, e.g. /event/<int:_id>, keeps one series per resource.
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    labels = {'route': route, 'method': request.method}
+    request_seconds.observe(time.perf_counter() - started, **labels)
+    request_queries.observe(environ[QUERIES], **labels)
+    request_db_seconds.observe(environ[DB_SECONDS], **labels)
+    requests_total.inc(status=environ.get(STATUS, 500), **labels)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, dropped with it when the statement fails.
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_start', None)
+    if started is not None and has_request_context():
+        environ = request.environ
+        if QUERIES in environ:
+            environ[QUERIES] += 1
+            environ[DB_SECONDS] += time.perf_counter() - started
+
+
+def instrument(app):
+    """ Record the metrics of every request of `app` and of the queries they run. """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
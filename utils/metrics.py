@@ -0,0 +1,139 @@
+import bisect
+import threading
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in labels)
+    return '{' + pairs + '}'
+
+
+class Metric:
+    """ Base of the metrics, one value per set of labels. """
+    kind = 'untyped'
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in self._values.items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Value set by the worker, or read from `callback` at every scrape when it is
+    given, for the values shared by the workers such as the size of a table.
+    A callback failing or returning None leaves the gauge out of the scrape.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, description, callback=None):
+        super().__init__(name, description)
+        self.callback = callback
+
+    def samples(self):
+        if self.callback is None:
+            return super().samples()
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return [] if value is None else [(self.name, (), value)]
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """ Counts of the observed values per upper bound, with their sum and count. """
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, description, buckets=None):
+        super().__init__(name, description)
+        self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for labels, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    samples.append((f"{self.name}_bucket", labels + (('le', le),), cumulative))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class Registry:
+    """ Holds the metrics of the worker and renders them in the Prometheus text format. """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, description, *args):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, description, *args)
+            return self._metrics[name]
+
+    def counter(self, name, description) -> Counter:
+        return self._register(Counter, name, description)
+
+    def gauge(self, name, description, callback=None) -> Gauge:
+        return self._register(Gauge, name, description, callback)
+
+    def histogram(self, name, description, buckets=None) -> Histogram:
+        return self._register(Histogram, name, description, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+registry = Registry()
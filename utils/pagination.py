@@ -0,0 +1,79 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(values) -> str:
+    """Turns the sort key of the last row of a page into an opaque token."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(token: str, columns) -> list:
+    """Reads back the sort key encoded by `encode_cursor` for the given columns."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(token)
+    if not isinstance(payload, list) or len(payload) != len(columns):
+        raise InvalidCursor(token)
+
+    return [_decode_value(column, value, token) for column, value in zip(columns, payload)]
+
+
+def _decode_value(column, value, token):
+    """ A value of the cursor, checked against the type of its column. """
+    python_type = column.type.python_type
+    if python_type is datetime:
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise InvalidCursor(token)
+    if python_type in (float, Decimal):
+        python_type = (int, float)
+    # bool is an int, but never the value of an integer column.
+    if isinstance(value, bool) or not isinstance(value, python_type):
+        raise InvalidCursor(token)
+    return value
+
+
+def keyset_query(query, columns, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    """
+    Query of one page of `query` ordered on `columns`, plus one row telling if
+    there is a next page.
+
+    The cursor holds the sort key of the last row, so the next page is a range scan
+    starting after it instead of an OFFSET: deep pages cost the same as the first one.
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        clauses = []
+        for i, column in enumerate(columns):
+            after = column < values[i] if descending else column > values[i]
+            equals = [columns[j] == values[j] for j in range(i)]
+            clauses.append(and_(*equals, after))
+        query = query.filter(or_(*clauses))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    return query.order_by(*order).limit(limit + 1)
+
+
+def keyset_page(rows, columns, limit=DEFAULT_PAGE_SIZE):
+    """ Split the rows of `keyset_query` into the page and the cursor of the next page. """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return rows, next_cursor
@@ -0,0 +1,92 @@
+""" Connection pool settings from the environment, and metrics of the pools. """
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+from utils.metrics import registry
+
+checkout_seconds = registry.histogram(
+    'db_pool_checkout_seconds', 'Time spent waiting for a connection from the pool.',
+    buckets=(.0005, .001, .005, .01, .05, .1, .5, 1, 5, 10, 30))
+checkout_timeouts = registry.counter(
+    'db_pool_checkout_timeouts_total', 'Checkouts given up after DB_POOL_TIMEOUT seconds.')
+in_use = registry.gauge('db_pool_connections_in_use', 'Connections checked out of the pool.')
+overflow = registry.gauge(
+    'db_pool_overflow', 'Connections open beyond DB_POOL_SIZE, negative while some are unopened.')
+invalidated = registry.counter(
+    'db_pool_invalidated_total', 'Connections dropped after an error, e.g. MySQL gone away.')
+
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options(uri: str, environ=os.environ) -> dict:
+    """
+    SQLALCHEMY_ENGINE_OPTIONS of a database from DB_POOL_SIZE, DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT, DB_POOL_RECYCLE and DB_POOL_PRE_PING.
+
+    Connections are checked before use and recycled before MySQL closes them
+    (wait_timeout), so that a worker never gets a connection that has gone away.
+    SQLite has no server connections to pool, only those two settings apply to it.
+    """
+    options = {
+        'pool_pre_ping': _flag(environ.get('DB_POOL_PRE_PING', 'true')),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+    if (uri or '').startswith('sqlite'):
+        return options
+    options.update({
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': int(environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(environ.get('DB_POOL_TIMEOUT', 30)),
+    })
+    return options
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool timing the wait for a connection, which the pool events cannot see
+    since they run once it is handed out, and reporting its usage after each
+    checkout and checkin.
+
+    Those are methods rather than pool events: `recreate`, run by `engine.dispose()`,
+    copies the listeners of the pool into the new one, where they would count twice
+    and report the old pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        recreated = '_dispatch' in kwargs
+        super().__init__(*args, **kwargs)
+        # Named after its bind by `db.RoutingSQLAlchemy.get_engine`.
+        self.name = 'primary'
+        if not recreated:
+            # Copied by `recreate`, and the bind, so the name, stays the same.
+            event.listen(self, 'invalidate', lambda *args: invalidated.inc(pool=self.name))
+
+    def connect(self):
+        connection = super().connect()
+        self._report()
+        return connection
+
+    def _do_return_conn(self, conn):
+        super()._do_return_conn(conn)
+        self._report()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            checkout_timeouts.inc(pool=self.name)
+            raise
+        finally:
+            checkout_seconds.observe(time.perf_counter() - started, pool=self.name)
+
+    def _report(self):
+        in_use.set(self.checkedout(), pool=self.name)
+        overflow.set(self.overflow(), pool=self.name)
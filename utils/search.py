@@ -0,0 +1,146 @@
+import bisect
+import math
+import re
+import threading
+import unicodedata
+
+_WORD = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """ Lowercase a text and strip its accents: "Évènement" -> "evenement". """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text: str) -> list:
+    return _WORD.findall(fold(text))
+
+
+# Words MySQL leaves out of a FULLTEXT index: the InnoDB default stopwords, and the
+# French articles and prepositions, for a French stopword table. Folded like the tokens.
+FULLTEXT_STOPWORDS = frozenset((
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from',
+    'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to',
+    'was', 'what', 'when', 'where', 'who', 'will', 'with', 'und', 'www',
+    'au', 'aux', 'd', 'des', 'du', 'et', 'l', 'le', 'les', 'un', 'une',
+))
+
+
+def boolean_query(tokens: list, min_token_size: int) -> str:
+    """
+    MySQL BOOLEAN MODE query matching the prefixes of `tokens`. Only the words MySQL
+    indexes are required, "fete de la musique" -> "+fete* de* la* +musique*": a stopword
+    or a word shorter than innodb_ft_min_token_size would never match otherwise.
+    """
+    return ' '.join(
+        f"{'' if len(token) < min_token_size or token in FULLTEXT_STOPWORDS else '+'}{token}*"
+        for token in tokens
+    )
+
+
+class InvertedIndex:
+    """
+    In-process full-text index with accent folding, prefix matching and a
+    tf-idf ranking weighted by field.
+    """
+
+    def __init__(self, weights: dict):
+        self.weights = weights
+        self.built = False
+        # Version of the data the index reflects, kept up to date by its owner.
+        self.generation = None
+        self._postings = {}  # term -> {doc_id: weighted term frequency}
+        self._documents = {}  # doc_id -> terms
+        self._terms = []  # sorted terms, for prefix lookups
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, doc_id, fields: dict) -> None:
+        """ Index a document, replacing its previous version. """
+        frequencies = {}
+        for field, text in fields.items():
+            for term in tokenize(text):
+                frequencies[term] = frequencies.get(term, 0) + self.weights.get(field, 1.0)
+
+        with self._lock:
+            self.remove(doc_id)
+            for term, frequency in frequencies.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    bisect.insort(self._terms, term)
+                postings[doc_id] = frequency
+            self._documents[doc_id] = set(frequencies)
+
+    def remove(self, doc_id) -> None:
+        with self._lock:
+            for term in self._documents.pop(doc_id, ()):
+                postings = self._postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[term]
+                    del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def rebuild(self, documents, generation=None) -> None:
+        """
+        Replace the whole index by `documents`, an iterable of (doc_id, fields), read
+        at `generation`.
+        """
+        with self._lock:
+            self.clear()
+            for doc_id, fields in documents:
+                self.add(doc_id, fields)
+            self.built = True
+            self.generation = generation
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._terms.clear()
+            self.built = False
+            self.generation = None
+
+    def _expand(self, token: str) -> list:
+        """ Indexed terms starting with `token`, the exact term first. """
+        start = bisect.bisect_left(self._terms, token)
+        end = bisect.bisect_left(self._terms, token + '\uffff')
+        return self._terms[start:end]
+
+    def search(self, query: str, limit: int) -> list:
+        """
+        Ids of the documents matching every word of `query`, a word matching the
+        terms it starts, best ranked first. Exact words rank above prefixes.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            total = len(self._documents) or 1
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    boost = 1.0 if term == token else 0.7
+                    for doc_id, frequency in postings.items():
+                        score = frequency * idf * boost
+                        if score > token_scores.get(doc_id, 0):
+                            token_scores[doc_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        doc_id: score + token_scores[doc_id]
+                        for doc_id, score in scores.items() if doc_id in token_scores
+                    }
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [doc_id for doc_id, score in ranked[:limit]]
@@ -0,0 +1,246 @@
+""" Storage of the uploads: a local folder, or a bucket of an S3 compatible server. """
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import mimetypes
+import os
+import posixpath
+import tempfile
+
+from werkzeug.security import safe_join
+
+DEFAULT_ROOT = f"{os.getcwd()}/uploads"
+
+# What the server needs to answer conditional and range requests without reading the file.
+StoredFile = namedtuple('StoredFile', ['size', 'modified', 'etag'])
+
+
+def _content_type(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or 'application/octet-stream'
+
+
+class _FilePart:
+    """ `length` bytes of an open file from its current position, closing the file. """
+
+    def __init__(self, file, length):
+        self._file = file
+        self._remaining = length
+
+    def read(self, size=-1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size) if size else b''
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+class LocalBackend:
+    """ Files under a folder of this node, which the front server can send itself. """
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+
+    def local_path(self, key: str):
+        """ Path of a key, None for keys out of the folder, e.g. event/../../etc/passwd. """
+        return safe_join(self.root, key)
+
+    def stat(self, key: str):
+        path = self.local_path(key)
+        if path is None or not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        return StoredFile(
+            stat.st_size, datetime.utcfromtimestamp(int(stat.st_mtime)),
+            f"{int(stat.st_mtime)}-{stat.st_size}")
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def open(self, key: str, byte_range=None):
+        file = open(self.local_path(key), 'rb')
+        if byte_range is None:
+            return file
+        start, stop = byte_range
+        file.seek(start)
+        return _FilePart(file, stop - start)
+
+    def temporary_file(self) -> tuple:
+        """ A file to write an upload to, on the same file system so that it can be moved. """
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.mkstemp(dir=self.root, suffix='.part')
+
+    def put_file(self, key: str, path: str) -> None:
+        """ Store the file at `path` under `key`, moving it. """
+        destination = self.local_path(key)
+        if os.path.abspath(path) == destination:
+            return
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(path, destination)
+
+    def delete(self, keys: list) -> None:
+        for key in keys:
+            path = self.local_path(key)
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    @contextmanager
+    def local_copy(self, key: str):
+        """ The file itself: what is written next to it is already stored. """
+        yield self.local_path(key)
+
+
+class S3Backend:
+    """
+    Objects of a bucket of Amazon S3 or of an S3 compatible server (MinIO, Ceph...) at
+    `endpoint_url`, shared by every node. Credentials come from the usual AWS_*
+    variables. Files are uploaded and downloaded in parts, never held in memory.
+
+    Needs the `boto3` package, which is only imported when this backend is selected.
+    """
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        self._boto3 = boto3
+        self._client_error = ClientError
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self._client = None
+        self._pid = None
+
+    @property
+    def client(self):
+        # boto3 clients cannot be shared with the processes of the image worker.
+        if self._client is None or self._pid != os.getpid():
+            self._client = self._boto3.session.Session().client(
+                's3', endpoint_url=self.endpoint_url, region_name=self.region)
+            self._pid = os.getpid()
+        return self._client
+
+    def local_path(self, key: str):
+        return None
+
+    def stat(self, key: str):
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self._client_error as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        modified = head['LastModified'].astimezone(timezone.utc).replace(tzinfo=None)
+        return StoredFile(head['ContentLength'], modified, head['ETag'].strip('"'))
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def open(self, key: str, byte_range=None):
+        """ Body of the object, or of the range only, read from the network as it is consumed. """
+        options = {}
+        if byte_range is not None:
+            start, stop = byte_range
+            options['Range'] = f"bytes={start}-{stop - 1}"
+        return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key, **options)['Body']
+
+    def temporary_file(self) -> tuple:
+        return tempfile.mkstemp(suffix='.part')
+
+    def put_file(self, key: str, path: str) -> None:
+        self.client.upload_file(
+            path, self.bucket, self.prefix + key, ExtraArgs={'ContentType': _content_type(key)})
+
+    def delete(self, keys: list) -> None:
+        if keys:
+            self.client.delete_objects(Bucket=self.bucket, Delete={
+                'Objects': [{'Key': self.prefix + key} for key in keys], 'Quiet': True
+            })
+
+    @contextmanager
+    def local_copy(self, key: str):
+        """ A copy of the object in a temporary folder, removed with what is written next to it. """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, posixpath.basename(key))
+            self.client.download_file(self.bucket, self.prefix + key, path)
+            yield path
+
+
+def make_backend(url=None, endpoint_url=None, region=None):
+    """ Build the backend matching an UPLOAD_STORAGE: a folder (default) or s3://bucket/prefix. """
+    if not url:
+        return LocalBackend()
+    if url.startswith('s3://'):
+        bucket, _, prefix = url[len('s3://'):].partition('/')
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        return S3Backend(bucket, prefix, endpoint_url=endpoint_url, region=region)
+    if url.startswith('file://'):
+        url = url[len('file://'):]
+    if '://' in url:
+        raise ValueError(f"Unsupported upload storage: {url}")
+    return LocalBackend(os.path.abspath(url))
+
+
+class Storage:
+    """
+    Uploads storage, configured from UPLOAD_STORAGE, S3_ENDPOINT_URL and S3_REGION.
+    Files are addressed by keys such as event/9f/86/9f86d081...png, see `utils.upload_key`.
+    """
+
+    def __init__(self, app=None):
+        self.backend = LocalBackend()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.configure(
+            app.config.get('UPLOAD_STORAGE'),
+            app.config.get('S3_ENDPOINT_URL'),
+            app.config.get('S3_REGION')
+        )
+        app.extensions['storage'] = self
+
+    def configure(self, url=None, endpoint_url=None, region=None):
+        """ Also run by the processes of the image worker, which have no application. """
+        self.backend = make_backend(url, endpoint_url, region)
+
+    def local_path(self, key: str):
+        """ Path of a key on this node, None when the backend is remote. """
+        return self.backend.local_path(key)
+
+    def stat(self, key: str):
+        """ StoredFile of a key, None when it is not stored. """
+        return self.backend.stat(key)
+
+    def exists(self, key: str) -> bool:
+        return self.backend.exists(key)
+
+    def open(self, key: str, byte_range=None):
+        """
+        Binary stream of a stored file, or of its bytes from `start` to `stop` (excluded)
+        with `byte_range`, to be read in chunks and closed.
+        """
+        return self.backend.open(key, byte_range)
+
+    def temporary_file(self) -> tuple:
+        """ Descriptor and path of a new temporary file, as returned by `tempfile.mkstemp`. """
+        return self.backend.temporary_file()
+
+    def put_file(self, key: str, path: str) -> None:
+        """ Store the file at `path` under `key`. The file may be moved. """
+        self.backend.put_file(key, path)
+
+    def delete(self, keys: list) -> None:
+        """ Delete the stored files of `keys`, skipping those already gone. """
+        self.backend.delete(keys)
+
+    def local_copy(self, key: str):
+        """ Context manager giving the path of a stored file on this node. """
+        return self.backend.local_copy(key)
+
+
+storage = Storage()
@@ -0,0 +1,85 @@
+""" Streamed exports of whole tables, in constant memory whatever their size. """
+import csv
+import io
+
+from flask import Response, request, stream_with_context
+
+from utils.encoding import dumps
+
+STREAM_BATCH_SIZE = 1000
+# Rows written per chunk of the response body.
+CHUNK_ROWS = 100
+
+JSON = 'application/json'
+NDJSON = 'application/x-ndjson'
+CSV = 'text/csv'
+
+
+def stream_mimetype(stream=False):
+    """
+    Format of the export asked by the Accept header, or None when the request wants
+    the plain JSON response: NDJSON and CSV are always streamed, JSON only with `stream`.
+    """
+    mimetype = request.accept_mimetypes.best_match((JSON, NDJSON, CSV), default=JSON)
+    if mimetype == JSON and not stream:
+        return None
+    return mimetype
+
+
+def _chunks(lines):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == CHUNK_ROWS:
+            yield b''.join(chunk)
+            chunk = []
+    if chunk:
+        yield b''.join(chunk)
+
+
+def _json(key, rows):
+    """ The same {key: [rows]} document as the plain response, one row at a time. """
+    yield b'{"' + key.encode() + b'":['
+    for i, row in enumerate(rows):
+        yield (b',' if i else b'') + dumps(row).rstrip(b'\n')
+    yield b']}\n'
+
+
+def _ndjson(key, rows):
+    for row in rows:
+        yield dumps(row)
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode().rstrip('\n')
+    return value
+
+
+def _csv(key, rows):
+    """ One line per row under a header from the first row; nested values are JSON. """
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row), extrasaction='ignore')
+            writer.writeheader()
+        writer.writerow({name: _csv_value(value) for name, value in row.items()})
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+_WRITERS = {JSON: _json, NDJSON: _ndjson, CSV: _csv}
+
+
+def stream_response(key: str, rows, mimetype=JSON) -> Response:
+    """
+    Response writing the `rows` dicts as they come, e.g. from a `yield_per` query,
+    so that only one batch of them is in memory at a time.
+    """
+    body = _chunks(_WRITERS[mimetype](key, rows))
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    if mimetype == CSV:
+        response.headers['Content-Disposition'] = f'attachment; filename="{key}.csv"'
+    return response
@@ -0,0 +1,22 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def start_sweeper(app, job, interval: int, name='sweeper') -> threading.Thread:
+    """ Run `job` every `interval` seconds in a daemon thread, inside an app context. """
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            with app.app_context():
+                try:
+                    job()
+                except Exception:
+                    logger.exception('%s run failed.', name)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.stopped = stopped
+    thread.start()
+    return thread
@@ -0,0 +1,109 @@
+""" Worker making the variants of the uploaded images, see `models.image_job`. """
+import logging
+import os
+import posixpath
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from models.image_job import ImageJobModel
+from utils import remove_file_upload, upload_key, variant_keys
+from utils.images import make_variants
+from utils.metrics import registry
+from utils.storage import storage
+
+logger = logging.getLogger(__name__)
+
+jobs_total = registry.counter('image_jobs_total', 'Image jobs run, per outcome.')
+
+
+def _process(key: str) -> None:
+    """
+    Runs in a pool process: nothing but the image work, no database. The variants
+    of an image uploaded again are already stored.
+    """
+    if all(storage.exists(variant) for variant in variant_keys(key)):
+        return
+    folder = posixpath.dirname(key)
+    with storage.local_copy(key) as path:
+        for variant in make_variants(path):
+            storage.put_file(posixpath.join(folder, os.path.basename(variant)), variant)
+
+
+def run_batch(app, executor, batch_size: int) -> int:
+    """
+    Claim up to `batch_size` due jobs, process them in the pool and record the outcome.
+    Raises BrokenProcessPool when a pool process died, e.g. killed when out of memory,
+    once the jobs it left unfinished are back in the queue without a counted attempt.
+    """
+    config = app.config
+    ImageJobModel.release_stale(config['IMAGE_JOB_TIMEOUT'])
+    jobs = ImageJobModel.claim(batch_size)
+    broken = False
+    futures = []
+    for job in jobs:
+        try:
+            futures.append((job, executor.submit(_process, upload_key(job.filename, job.folder))))
+        except BrokenProcessPool:
+            broken = True
+            futures.append((job, None))
+    for job, future in futures:
+        try:
+            if future is None:
+                raise BrokenProcessPool()
+            future.result(timeout=config['IMAGE_JOB_TIMEOUT'])
+        except BrokenProcessPool:
+            broken = True
+            job.release()
+            jobs_total.inc(outcome='released')
+            continue
+        except Exception as e:
+            dead = job.fail(
+                f"{type(e).__name__}: {e}",
+                config['IMAGE_JOB_MAX_ATTEMPTS'], config['IMAGE_JOB_BACKOFF'])
+            jobs_total.inc(outcome='dead' if dead else 'retried')
+            if dead:
+                # The file and its reference stay until the dead letter is discarded.
+                logger.error('Image job %s is dead: %s', job._id, job.last_error)
+            continue
+        replaced = job.complete()
+        jobs_total.inc(outcome='done')
+        if replaced:
+            remove_file_upload(replaced, job.folder)
+    if broken:
+        raise BrokenProcessPool('A process of the image worker pool died.')
+    return len(jobs)
+
+
+def _executor(app, processes: int) -> ProcessPoolExecutor:
+    config = app.config
+    return ProcessPoolExecutor(
+        max_workers=processes, initializer=storage.configure,
+        initargs=(config['UPLOAD_STORAGE'], config['S3_ENDPOINT_URL'], config['S3_REGION']))
+
+
+def run(app, processes=None, poll_interval=2.0, once=False) -> None:
+    """
+    Process the image jobs with `processes` worker processes (one per CPU by
+    default), polling the queue every `poll_interval` seconds when it is empty.
+    With `once`, stop as soon as the queue is drained. A pool whose process died
+    is replaced by a new one.
+    """
+    processes = processes or os.cpu_count() or 1
+    executor = _executor(app, processes)
+    try:
+        while True:
+            try:
+                with app.app_context():
+                    processed = run_batch(app, executor, batch_size=processes * 2)
+            except BrokenProcessPool:
+                logger.exception('Image worker pool broken, starting a new one')
+                executor.shutdown(wait=False)
+                executor = _executor(app, processes)
+                continue
+            if not processed:
+                if once:
+                    return
+                time.sleep(poll_interval)
+    finally:
+        executor.shutdown()